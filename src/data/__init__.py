@@ -1,2 +1,3 @@
 from .heart_rate import hr_max
 from .athlete_class import Athlete
+from .cohort import Cohort
@@ -2,22 +2,228 @@
 import polars as pl
 import numpy as np
 import datetime as dt
+from collections.abc import Iterable
 from opendata import OpenData
 import opendata.models as models
 from botocore.exceptions import ClientError
 from rust_utils import hampel_filter
 
 
+# HELPER FUNCTIONS
+
+# Scaling factor relating the median absolute deviation to the standard deviation, as used in rust_utils.hampel_filter
+K_MAD_SCALING_FACTOR = 1.4826
+
+
+def _fill_nearest(before: pl.Expr, after: pl.Expr, fraction: pl.Expr) -> pl.Expr:
+    """Takes the sample nearest in time, or null if either sample is null."""
+    return (
+        pl.when(before.is_null() | after.is_null())
+        .then(None)
+        .when(fraction <= 0.5)
+        .then(before)
+        .otherwise(after)
+    )
+
+
+# Methods available to ActivityFunctions.fill_gaps for synthesizing missing samples
+# Each takes the samples either side of the gap and the fraction of the gap elapsed, and returns null if a sample it uses is null
+FILL_METHODS = {
+    "linear": lambda before, after, fraction: before + (after - before) * fraction,
+    "nearest": _fill_nearest,
+    "forward": lambda before, after, fraction: before,
+    "backward": lambda before, after, fraction: after,
+}
+
+# Default values for every parameter that can be swept
+SWEEP_DEFAULTS = {
+    "half_window": 10,
+    "n_sigma": 3.0,
+    "hr_threshold": 0.8,
+    "window_len": 4,
+}
+
+
+def hampel_window_stats(data, half_window: int):
+    """Calculates the rolling median and median absolute deviation (MAD) used by the Hampel filter.
+    Args:
+        data: A one dimensional array-like of values.
+        half_window (int): The number of values on either side of the centre of each window.
+
+    Returns:
+        A tuple of numpy arrays (medians, mads) for every complete window, or None if the series is shorter than a single window.
+    """
+    values = np.asarray(data, dtype=np.float64)
+    window_size = 2 * half_window + 1
+
+    if half_window < 1 or values.size < window_size:
+        return None
+
+    # Every row of windows is one complete window, so the median and MAD are calculated in a single vectorised step
+    windows = np.lib.stride_tricks.sliding_window_view(values, window_size)
+    medians = np.median(windows, axis=1)
+    mads = np.median(np.abs(windows - medians[:, None]), axis=1)
+
+    return medians, mads
+
+
+def hampel_filter_sweep(data, half_window: int, n_sigmas) -> dict:
+    """Applies the Hampel filter to a series for several n_sigma values, sharing the window medians between them.
+    Args:
+        data: A one dimensional array-like of values.
+        half_window (int): The number of values on either side of the centre of each window.
+        n_sigmas: An iterable of thresholds, in scaled MADs, above which a value is considered an outlier.
+
+    Returns:
+        dict: A dictionary mapping each n_sigma value to the filtered numpy array.
+    """
+    values = np.asarray(data, dtype=np.float64)
+    stats = hampel_window_stats(values, half_window)
+
+    # Series shorter than a single window are returned unchanged, matching rust_utils.hampel_filter
+    if stats is None:
+        return {n_sigma: values.copy() for n_sigma in n_sigmas}
+
+    medians, mads = stats
+    deviations = np.abs(values[half_window : values.size - half_window] - medians)
+
+    filtered = {}
+    for n_sigma in n_sigmas:
+        outliers = deviations > n_sigma * K_MAD_SCALING_FACTOR * mads
+        filtered_values = values.copy()
+        filtered_values[half_window : values.size - half_window][outliers] = medians[
+            outliers
+        ]
+        filtered[n_sigma] = filtered_values
+
+    return filtered
+
+
+def expand_param_grid(param_grid: dict, keys: list) -> dict:
+    """Validates a parameter grid and fills in defaults for any parameter that is not being swept.
+    Args:
+        param_grid (dict): A dictionary mapping parameter names to a value or an iterable of values, e.g. a list, range or numpy array.
+        keys (list): The parameter names accepted by the calling sweep.
+
+    Returns:
+        dict: A dictionary mapping every key to a list of unique values.
+    """
+    unknown_keys = set(param_grid) - set(keys)
+    if unknown_keys:
+        raise ValueError(
+            f"Unknown sweep parameters {sorted(unknown_keys)}. Valid parameters are {keys}."
+        )
+
+    expanded = {}
+    for key in keys:
+        values = param_grid.get(key, SWEEP_DEFAULTS[key])
+
+        # Any non-string iterable, e.g. a list, range or numpy array, is swept. Numpy scalars become Python values
+        if isinstance(values, str) or not isinstance(values, Iterable):
+            values = [values]
+        values = np.asarray(list(values)).tolist()
+        if not values:
+            raise ValueError(f"No values given for sweep parameter {key!r}.")
+
+        # Removing duplicates, keeping order
+        expanded[key] = list(dict.fromkeys(values))
+
+    return expanded
+
+
 # ACTIVITY FUNCTIONS
 class ActivityFunctions:
+    @staticmethod
+    def fill_gaps(
+        df: pl.DataFrame,
+        max_gap: int,
+        fill_methods: dict | None = None,
+        default_method: str = "linear",
+    ) -> tuple[pl.DataFrame, int]:
+        """Bridges short gaps in the secs series of an activity by synthesizing the missing samples.
+
+        Segmentation splits a ride at any gap in secs, so bridging gaps of one or two seconds produces fewer, longer segments.
+        Args:
+            df (pl.DataFrame): The activity data as a polars dataframe, sorted by secs. secs must hold whole seconds.
+            max_gap (int): The maximum number of missing seconds to bridge. Longer gaps are left in place.
+            fill_methods (dict): Optional mapping of column name to fill method ("linear", "nearest", "forward" or "backward").
+            default_method (str): The fill method for numeric columns missing from fill_methods. Other columns are forward filled.
+
+        Returns:
+            A tuple of the gap filled dataframe and the number of samples synthesized.
+        """
+        fill_methods = fill_methods or {}
+        unknown_methods = set(fill_methods.values()) - set(FILL_METHODS)
+        if unknown_methods:
+            raise ValueError(
+                f"Unknown fill methods {sorted(unknown_methods)}. Valid methods are {list(FILL_METHODS)}."
+            )
+
+        # Synthesized samples are one second apart, so fractional secs values cannot be bridged
+        if not df["secs"].dtype.is_integer() and (df["secs"] % 1 != 0).any():
+            raise ValueError(
+                "fill_gaps requires secs to hold whole seconds, but fractional values were found."
+            )
+
+        value_cols = [col for col in df.columns if col != "secs"]
+
+        # Identifying gaps of up to max_gap missing seconds, together with the real samples either side of each gap
+        gaps = df.select(
+            pl.col("secs").cast(pl.Int64).alias("gap_end"),
+            pl.col("secs").cast(pl.Int64).diff().alias("gap"),
+            *[pl.col(col).shift(1).alias(f"{col}_before") for col in value_cols],
+            *[pl.col(col).alias(f"{col}_after") for col in value_cols],
+        ).filter(pl.col("gap") > 1, pl.col("gap") <= max_gap + 1)
+
+        if gaps.is_empty():
+            return df, 0
+
+        # Creating one row for every missing second, with the fraction of its gap elapsed
+        df_synthetic = (
+            gaps.with_columns(
+                pl.int_ranges(
+                    pl.col("gap_end") - pl.col("gap") + 1, pl.col("gap_end")
+                ).alias("secs")
+            )
+            .explode("secs")
+            .with_columns(
+                (
+                    (pl.col("secs") - pl.col("gap_end") + pl.col("gap")) / pl.col("gap")
+                ).alias("fraction")
+            )
+        )
+
+        # Each synthesized value only depends on the two samples bounding its own gap
+        fill_exprs = [pl.col("secs").cast(df.schema["secs"])]
+        for col in value_cols:
+            dtype = df.schema[col]
+            method = fill_methods.get(
+                col, default_method if dtype.is_numeric() else "forward"
+            )
+            filled = FILL_METHODS[method](
+                pl.col(f"{col}_before"), pl.col(f"{col}_after"), pl.col("fraction")
+            )
+            if dtype.is_integer():
+                filled = filled.round(0)
+            fill_exprs.append(filled.cast(dtype).alias(col))
+
+        df_synthetic = df_synthetic.select(fill_exprs).select(df.columns)
+
+        df_filled = pl.concat([df, df_synthetic]).sort("secs", maintain_order=True)
+
+        return df_filled, df_synthetic.height
+
     @staticmethod
     def process_hrr(
-        activity_instance: models.Activity, max_hr: int
+        activity_instance: models.Activity,
+        max_hr: int,
+        data: pl.DataFrame | None = None,
     ) -> pl.DataFrame | None:
         """Processes activity data and returns a dataframe on heart rate recovery.
         Args:
             activity_instance: An instance of opendata.models.Activity.
             max_hr: The maximum heart rate for the athlete.
+            data: Optional pre-processed activity data, e.g. the output of fill_gaps(). Defaults to the activity's data.
 
         Returns:
             An output polars dataframe containing the highest HRR collected from the activity.
@@ -30,6 +236,8 @@ class ActivityFunctions:
             return None
         elif activity_instance.data["hr"].isna().all():
             return None
+        elif data is not None:
+            df = data
         else:
             # Converting the activity data to a polars dataframe
             df = pl.from_pandas(activity_instance.data)
@@ -147,6 +355,7 @@ class ActivityFunctions:
         max_hr: int,
         hr_threshold: float,
         window_len: int,
+        data: pl.DataFrame | None = None,
     ):
         """Processes activity and returns a dataframe on maximum mean power over the specified window size.
         Args:
@@ -154,6 +363,7 @@ class ActivityFunctions:
             max_hr (int): The athlete's maximum heart rate.
             hr_threshold (float): The threshold percentage, in decimal format, for the athlete's mean heart rate over the window size for it to be considered a near maximal effort.
             window_len (int): The window size in minutes over which to calculate maximal mean power.
+            data (pl.DataFrame): Optional pre-processed activity data, e.g. the output of fill_gaps(). Defaults to the activity's data.
         Returns:
             pl.DataFrame: A polars dataframe containing the maximum mean power for each activity.
         """
@@ -168,12 +378,25 @@ class ActivityFunctions:
         )
 
         # Filtering outliers from the heart rate series using the Hampel filter
-        activity_instance.data["hr"] = hampel_filter(
-            activity_instance.data["hr"].to_list(), half_window=10, n_sigma=3.0
-        )
+        if data is not None:
+            df = data.with_columns(
+                pl.Series(
+                    name="hr",
+                    values=hampel_filter(
+                        data["hr"].cast(pl.Float64).fill_null(np.nan).to_list(),
+                        half_window=10,
+                        n_sigma=3.0,
+                    ),
+                    nan_to_null=True,
+                )
+            )
+        else:
+            activity_instance.data["hr"] = hampel_filter(
+                activity_instance.data["hr"].to_list(), half_window=10, n_sigma=3.0
+            )
 
-        # Converting the activity data to a polars dataframe
-        df = pl.from_pandas(activity_instance.data)
+            # Converting the activity data to a polars dataframe
+            df = pl.from_pandas(activity_instance.data)
 
         # Identifying continuous segments in the dataframe and filtering out those that are too short
         df = df.with_columns(
@@ -285,6 +508,258 @@ class ActivityFunctions:
 
         return output_df
 
+    @staticmethod
+    def sweep_hrr(
+        activity_instance: models.Activity,
+        max_hr: int,
+        half_windows: list,
+        n_sigmas: list,
+        hr_thresholds: list,
+        data: pl.DataFrame | None = None,
+    ) -> pl.DataFrame | None:
+        """Evaluates HRR(30) for every combination of Hampel filter settings and HR thresholds in one pass over the activity.
+        Args:
+            activity_instance: An instance of opendata.models.Activity.
+            max_hr: The maximum heart rate for the athlete.
+            half_windows (list): Hampel filter half window sizes to evaluate.
+            n_sigmas (list): Hampel filter outlier thresholds to evaluate.
+            hr_thresholds (list): Thresholds, in decimal format, of maximum heart rate that the HR at the start of a window must reach.
+            data: Optional pre-processed activity data, e.g. the output of fill_gaps(). Defaults to the activity's data.
+
+        Returns:
+            A long format polars dataframe with the output of process_hrr for every parameter set, tagged by half_window, n_sigma and hr_threshold.
+        """
+
+        # Loading data into polars dataframe
+        if activity_instance.data is None:
+            return None
+        elif activity_instance.metadata is None:
+            return None
+        elif activity_instance.data["hr"].isna().all():
+            return None
+        elif data is not None:
+            df = data
+        else:
+            df = pl.from_pandas(activity_instance.data)
+
+        # The power filter and segmentation do not depend on any swept parameter, so they are only done once
+        df = df.filter(pl.col("power") <= 20, pl.col("hr") >= 25)
+        df = df.with_columns(
+            pl.col("secs").diff().fill_null(1).ne(1).cum_sum().alias("sequence_number")
+        ).filter(
+            pl.len().over("sequence_number") >= 30,
+        )
+
+        if df.is_empty():
+            return None
+
+        segments = df.partition_by("sequence_number", maintain_order=True)
+
+        swept_dfs = []
+        for half_window in half_windows:
+            # Filtering each segment once per half window. The window medians are shared by all n_sigma values.
+            filtered_segment_dfs = {n_sigma: [] for n_sigma in n_sigmas}
+            for segment in segments:
+                hr_by_sigma = hampel_filter_sweep(
+                    segment["hr"].to_numpy(), half_window, n_sigmas
+                )
+                for n_sigma, hr_filtered in hr_by_sigma.items():
+                    # Values at either end of the segment cannot be filtered and are dropped
+                    df_temp = (
+                        segment.with_columns(pl.Series(name="hr", values=hr_filtered))
+                        .with_columns(
+                            pl.when(
+                                pl.int_range(pl.len()).is_between(
+                                    half_window, pl.len() - half_window - 1
+                                )
+                            )
+                            .then(pl.col("hr"))
+                            .alias("hr")
+                        )
+                        .drop_nulls()
+                    )
+                    df_temp = df_temp.with_columns(
+                        pl.col("hr").diff().fill_null(0).alias("hr_delta")
+                    )
+                    filtered_segment_dfs[n_sigma].append(df_temp)
+
+            for n_sigma in n_sigmas:
+                # Building the rolling table once and applying every HR threshold to it
+                df_rolling = (
+                    pl.concat(filtered_segment_dfs[n_sigma])
+                    .with_columns(
+                        (-pl.col("hr_delta"))
+                        .rolling_sum(window_size=30, min_samples=30)
+                        .over("sequence_number")
+                        .alias("hr_drop_in_30s_window"),
+                        pl.col("hr").shift(29).alias("hr_at_window_start"),
+                    )
+                    .filter(
+                        pl.col("hr_drop_in_30s_window").is_not_null()
+                        & (pl.col("hr_drop_in_30s_window") >= 0)
+                    )
+                    .sort(
+                        by=["sequence_number", "hr_drop_in_30s_window"],
+                        descending=[False, True],
+                    )
+                )
+
+                for hr_threshold in hr_thresholds:
+                    df_threshold = (
+                        df_rolling.filter(
+                            pl.col("hr_at_window_start") >= hr_threshold * max_hr
+                        )
+                        .group_by("sequence_number", maintain_order=True)
+                        .head(1)
+                    )
+                    swept_dfs.append(
+                        df_threshold.select(
+                            pl.lit(half_window).cast(pl.Int64).alias("half_window"),
+                            pl.lit(n_sigma).cast(pl.Float64).alias("n_sigma"),
+                            pl.lit(hr_threshold).cast(pl.Float64).alias("hr_threshold"),
+                            (pl.col("secs") - 29)
+                            .cast(pl.Int64)
+                            .alias("hrr_window_start_secs"),
+                            pl.col("secs").cast(pl.Int64).alias("hrr_window_end_secs"),
+                            pl.col("hr_drop_in_30s_window")
+                            .cast(pl.Int64)
+                            .alias("HRR(30)"),
+                        )
+                    )
+
+        # Adding columns for date and activity to output dataframe
+        date = dt.datetime.strptime(
+            activity_instance.metadata["date"], r"%Y/%m/%d %H:%M:%S UTC"
+        )
+        df = (
+            pl.concat(swept_dfs)
+            .with_columns(
+                pl.lit(date).alias("date"),
+                pl.lit(activity_instance.id).alias("activity_id"),
+            )
+            .select(
+                [
+                    "half_window",
+                    "n_sigma",
+                    "hr_threshold",
+                    "activity_id",
+                    "date",
+                    "hrr_window_start_secs",
+                    "hrr_window_end_secs",
+                    "HRR(30)",
+                ]
+            )
+        )
+
+        return df
+
+    @staticmethod
+    def sweep_MaxMeanPower(
+        activity_instance: models.Activity,
+        max_hr: int,
+        half_windows: list,
+        n_sigmas: list,
+        hr_thresholds: list,
+        window_lens: list,
+        data: pl.DataFrame | None = None,
+    ) -> pl.DataFrame | None:
+        """Evaluates maximal mean power for every combination of Hampel filter settings, HR thresholds and window sizes in one pass over the activity.
+        Args:
+            activity_instance (models.Activity): An instance of opendata.models.Activity.
+            max_hr (int): The athlete's maximum heart rate.
+            half_windows (list): Hampel filter half window sizes to evaluate.
+            n_sigmas (list): Hampel filter outlier thresholds to evaluate.
+            hr_thresholds (list): Thresholds, in decimal format, for the athlete's mean heart rate over the window.
+            window_lens (list): Window sizes in minutes over which to calculate maximal mean power.
+            data (pl.DataFrame): Optional pre-processed activity data, e.g. the output of fill_gaps(). Defaults to the activity's data.
+        Returns:
+            pl.DataFrame: A long format polars dataframe with the output of process_MaxMeanPower for every parameter set, tagged by half_window, n_sigma, hr_threshold and window_len.
+        """
+        # Returning None if metadata does not exist
+        if activity_instance.metadata is None:
+            return None
+
+        # Storing the date of the activity
+        date = dt.datetime.strptime(
+            activity_instance.metadata["date"],
+            r"%Y/%m/%d %H:%M:%S UTC",
+        )
+
+        # Unlike process_MaxMeanPower, the activity data is left unmodified so that every parameter set sees the raw HR series
+        if data is None:
+            data = pl.from_pandas(activity_instance.data)
+        hr_raw = data["hr"].cast(pl.Float64).fill_null(np.nan).to_numpy()
+        df = data.with_row_index("row_no").with_columns(
+            pl.col("secs").diff().ne(1).cum_sum().alias("segment_id")
+        )
+
+        # Rolling mean power does not depend on the HR filter, so it is calculated once per window size
+        power_tables = {
+            window_len: df.filter(
+                pl.len().over("segment_id") >= window_len * 60
+            ).with_columns(
+                pl.col("power")
+                .rolling_mean(window_len * 60)
+                .over("segment_id")
+                .alias("rolling_mean_power")
+            )
+            for window_len in window_lens
+        }
+
+        swept_dfs = []
+        for half_window in half_windows:
+            hr_by_sigma = hampel_filter_sweep(hr_raw, half_window, n_sigmas)
+            for n_sigma, hr_filtered in hr_by_sigma.items():
+                hr_series = pl.Series("hr", hr_filtered, nan_to_null=True)
+                for window_len, df_power in power_tables.items():
+                    df_rolling = df_power.with_columns(
+                        hr_series.gather(df_power["row_no"])
+                    ).with_columns(
+                        pl.col("hr")
+                        .rolling_mean(window_len * 60)
+                        .over("segment_id")
+                        .alias("rolling_mean_hr")
+                    )
+
+                    for hr_threshold in hr_thresholds:
+                        df_threshold = (
+                            df_rolling.filter(
+                                pl.col("rolling_mean_power").is_not_null(),
+                                pl.col("rolling_mean_hr") >= max_hr * hr_threshold,
+                            )
+                            .sort(
+                                ["segment_id", "rolling_mean_power"],
+                                descending=[False, True],
+                            )
+                            .group_by("segment_id", maintain_order=True)
+                            .first()
+                        )
+                        swept_dfs.append(
+                            df_threshold.select(
+                                pl.lit(half_window).cast(pl.Int64).alias("half_window"),
+                                pl.lit(n_sigma).cast(pl.Float64).alias("n_sigma"),
+                                pl.lit(hr_threshold)
+                                .cast(pl.Float64)
+                                .alias("hr_threshold"),
+                                pl.lit(window_len).cast(pl.Int64).alias("window_len"),
+                                pl.lit(activity_instance.id)
+                                .cast(pl.String)
+                                .alias("activity_id"),
+                                pl.lit(date).cast(pl.Datetime).alias("date"),
+                                (pl.col("secs") - window_len * 60)
+                                .cast(pl.Int64)
+                                .alias("mmp_window_start_secs"),
+                                pl.col("secs")
+                                .cast(pl.Int64)
+                                .alias("mmp_window_end_secs"),
+                                pl.col("rolling_mean_power")
+                                .cast(pl.Float64)
+                                .alias("maximal_mean_power"),
+                            )
+                        )
+
+        return pl.concat(swept_dfs)
+
 
 # ATHLETE FUNCTIONS
 
@@ -299,6 +774,7 @@ class Athlete:
         self.max_hr = None
         self.min_hr = None
         self.date_of_first_ride = None
+        self.synthesized_samples = {}
 
         # Try getting athlete data locally
         try:
@@ -326,6 +802,30 @@ class Athlete:
                 if ex.response["Error"]["Code"] == "NoSuchKey":
                     print("Athlete not found! Provide a valid athlete ID.")
 
+    def fill_activity_gaps(self, activity, max_gap: int, fill_methods: dict | None):
+        """Returns the activity data with gaps of up to max_gap seconds bridged, recording the number of synthesized samples in self.synthesized_samples.
+        Returns None, so that the activity's own data is used, if gap filling is disabled or the activity has no data.
+        """
+        if max_gap < 1 or activity.data is None:
+            return None
+
+        df, n_synthesized = ActivityFunctions.fill_gaps(
+            pl.from_pandas(activity.data), max_gap=max_gap, fill_methods=fill_methods
+        )
+        self.synthesized_samples[activity.id] = n_synthesized
+
+        return df
+
+    def report_synthesized_samples(self, max_gap: int):
+        """Prints the number of samples synthesized while bridging gaps."""
+        if max_gap < 1:
+            return
+        n_activities = sum(n > 0 for n in self.synthesized_samples.values())
+        print(
+            f"Synthesized {sum(self.synthesized_samples.values())} samples across {n_activities} activities "
+            f"for athlete {self.id} to bridge gaps of up to {max_gap} seconds."
+        )
+
     def get_gender(self):
         self.gender = self.metadata["ATHLETE"]["gender"]
 
@@ -415,10 +915,15 @@ class Athlete:
             print(f"Minimum heart rate for athlete {self.id} is {self.min_hr} bpm.")
             print(f"Maximum heart rate for athlete {self.id} is {self.max_hr} bpm.")
 
-    def process_hrr(self):
-        """Processes HRR(30) data for the athlete across all bike rides and returns a polars dataframe with the results."""
+    def process_hrr(self, max_gap: int = 0, fill_methods: dict | None = None):
+        """Processes HRR(30) data for the athlete across all bike rides and returns a polars dataframe with the results.
+        Args:
+            max_gap (int): The maximum number of missing seconds to bridge with ActivityFunctions.fill_gaps before segmentation. 0 disables gap filling.
+            fill_methods (dict): Optional mapping of column name to fill method, passed to ActivityFunctions.fill_gaps.
+        """
         # Creating an empty list to store the processed dataframes
         processed_dfs = []
+        self.synthesized_samples = {}
 
         # Checking if max_hr is set, if not, calling get_hr_min_max method to set it
         if self.max_hr is None:
@@ -437,12 +942,16 @@ class Athlete:
                 continue
             # Applying the ActivityFunctions.process_hrr method to each activity
             df = ActivityFunctions.process_hrr(
-                activity_instance=activity, max_hr=self.max_hr
+                activity_instance=activity,
+                max_hr=self.max_hr,
+                data=self.fill_activity_gaps(activity, max_gap, fill_methods),
             )
 
             # Adding the processed dataframe to the list
             processed_dfs.append(df)
 
+        self.report_synthesized_samples(max_gap)
+
         # Dropping all None values from the processed_dfs list
         processed_df = [df for df in processed_dfs if df is not None]
 
@@ -491,10 +1000,23 @@ class Athlete:
         # Returning the processed dataframe
         return processed_df
 
-    def process_mmp(self, hr_threshold: float, window_len: int):
-        """Processed maximal mean power over the specified window size for all the athlete's bike rides and returns a polars dataframe"""
+    def process_mmp(
+        self,
+        hr_threshold: float,
+        window_len: int,
+        max_gap: int = 0,
+        fill_methods: dict | None = None,
+    ):
+        """Processed maximal mean power over the specified window size for all the athlete's bike rides and returns a polars dataframe
+        Args:
+            hr_threshold (float): The threshold percentage, in decimal format, for the athlete's mean heart rate over the window.
+            window_len (int): The window size in minutes over which to calculate maximal mean power.
+            max_gap (int): The maximum number of missing seconds to bridge with ActivityFunctions.fill_gaps before segmentation. 0 disables gap filling.
+            fill_methods (dict): Optional mapping of column name to fill method, passed to ActivityFunctions.fill_gaps.
+        """
         # Creating an empty list to store the processed dataframes
         processed_dfs_list = []
+        self.synthesized_samples = {}
 
         # Checking whether max_hr is set, if not, calling get_hr_min_max method to set it
         if self.max_hr is None:
@@ -523,10 +1045,13 @@ class Athlete:
                 max_hr=self.max_hr,
                 hr_threshold=hr_threshold,
                 window_len=window_len,
+                data=self.fill_activity_gaps(activity, max_gap, fill_methods),
             )
 
             processed_dfs_list.append(df_result)
 
+        self.report_synthesized_samples(max_gap)
+
         if processed_dfs_list != []:
             # Concatenating all processed dataframes into a single dataframe
             output_df = (
@@ -607,3 +1132,157 @@ class Athlete:
         )
 
         return output_df
+
+    def sweep_hrr(
+        self, param_grid: dict, max_gap: int = 0, fill_methods: dict | None = None
+    ):
+        """Evaluates HRR(30) for every combination in param_grid across all the athlete's bike rides and returns a long format polars dataframe.
+        Args:
+            param_grid (dict): A dictionary mapping any of half_window, n_sigma and hr_threshold to a value or list of values. Missing parameters take the defaults used by process_hrr.
+            max_gap (int): The maximum number of missing seconds to bridge before segmentation. 0 disables gap filling.
+            fill_methods (dict): Optional mapping of column name to fill method, passed to ActivityFunctions.fill_gaps.
+        """
+        grid = expand_param_grid(param_grid, ["half_window", "n_sigma", "hr_threshold"])
+
+        # Creating an empty list to store the processed dataframes
+        processed_dfs = []
+        self.synthesized_samples = {}
+
+        # Checking if max_hr is set, if not, calling get_hr_min_max method to set it
+        if self.max_hr is None:
+            print("Athlete's max HR is unknown. Calculating it now.")
+            self.get_hr_min_max()
+        if self.date_of_first_ride is None:
+            self.get_date_of_first_ride()
+
+        # Iterating through each activity once, evaluating every parameter set per activity
+        for activity in self.activities:
+            if activity.metadata is None:
+                continue
+            if activity.metadata["sport"] != "Bike":
+                continue
+            df = ActivityFunctions.sweep_hrr(
+                activity_instance=activity,
+                max_hr=self.max_hr,
+                half_windows=grid["half_window"],
+                n_sigmas=grid["n_sigma"],
+                hr_thresholds=grid["hr_threshold"],
+                data=self.fill_activity_gaps(activity, max_gap, fill_methods),
+            )
+            if df is not None:
+                processed_dfs.append(df)
+
+        self.report_synthesized_samples(max_gap)
+
+        columns = [
+            ("athlete_id", pl.String),
+            ("gender", pl.String),
+            ("half_window", pl.Int64),
+            ("n_sigma", pl.Float64),
+            ("hr_threshold", pl.Float64),
+            ("week_no", pl.Int64),
+            ("activity_id", pl.String),
+            ("date", pl.Datetime),
+            ("hrr_window_start_secs", pl.Int64),
+            ("hrr_window_end_secs", pl.Int64),
+            ("HRR(30)", pl.Int64),
+        ]
+
+        # If no activity produced HRR windows, return an empty polars dataframe with the same schema as the output below
+        if processed_dfs == []:
+            return pl.DataFrame({}, schema=columns)
+
+        output_df = (
+            pl.concat(processed_dfs)
+            .with_columns(
+                pl.lit(self.id).cast(pl.String).alias("athlete_id"),
+                ((pl.col("date") - self.date_of_first_ride).dt.total_days() // 7)
+                .cast(pl.Int64)
+                .alias("week_no"),
+                pl.lit(self.metadata["ATHLETE"]["gender"]).alias("gender"),
+            )
+            .select([name for name, _ in columns])
+        )
+
+        return output_df
+
+    def sweep_mmp(
+        self, param_grid: dict, max_gap: int = 0, fill_methods: dict | None = None
+    ):
+        """Evaluates maximal mean power for every combination in param_grid across all the athlete's bike rides and returns a long format polars dataframe.
+        Args:
+            param_grid (dict): A dictionary mapping any of half_window, n_sigma, hr_threshold and window_len to a value or list of values. Missing parameters take the defaults used by process_mmp.
+            max_gap (int): The maximum number of missing seconds to bridge before segmentation. 0 disables gap filling.
+            fill_methods (dict): Optional mapping of column name to fill method, passed to ActivityFunctions.fill_gaps.
+        """
+        grid = expand_param_grid(
+            param_grid, ["half_window", "n_sigma", "hr_threshold", "window_len"]
+        )
+
+        # Creating an empty list to store the processed dataframes
+        processed_dfs_list = []
+        self.synthesized_samples = {}
+
+        # Checking whether max_hr is set, if not, calling get_hr_min_max method to set it
+        if self.max_hr is None:
+            print("Athlete's max HR is unknown. Calculating it now.")
+            self.get_hr_min_max()
+        if self.date_of_first_ride is None:
+            self.get_date_of_first_ride()
+
+        # Iterating through each activity once, evaluating every parameter set per activity
+        for activity in self.activities:
+            if activity.metadata is None:
+                continue
+            if (
+                activity.metadata["sport"] != "Bike"
+                or activity.data["hr"].isna().all()
+                or activity.data["power"].isna().all()
+            ):
+                continue
+
+            df_result = ActivityFunctions.sweep_MaxMeanPower(
+                activity_instance=activity,
+                max_hr=self.max_hr,
+                half_windows=grid["half_window"],
+                n_sigmas=grid["n_sigma"],
+                hr_thresholds=grid["hr_threshold"],
+                window_lens=grid["window_len"],
+                data=self.fill_activity_gaps(activity, max_gap, fill_methods),
+            )
+            if df_result is not None:
+                processed_dfs_list.append(df_result)
+
+        self.report_synthesized_samples(max_gap)
+
+        columns = [
+            ("athlete_id", pl.String),
+            ("gender", pl.String),
+            ("half_window", pl.Int64),
+            ("n_sigma", pl.Float64),
+            ("hr_threshold", pl.Float64),
+            ("window_len", pl.Int64),
+            ("week_no", pl.Int64),
+            ("activity_id", pl.String),
+            ("date", pl.Datetime),
+            ("mmp_window_start_secs", pl.Int64),
+            ("mmp_window_end_secs", pl.Int64),
+            ("maximal_mean_power", pl.Float64),
+        ]
+
+        if processed_dfs_list == []:
+            return pl.DataFrame({}, schema=columns)
+
+        output_df = (
+            pl.concat(processed_dfs_list)
+            .with_columns(
+                pl.lit(self.id).cast(pl.String).alias("athlete_id"),
+                pl.lit(self.metadata["ATHLETE"]["gender"]).alias("gender"),
+                ((pl.col("date") - self.date_of_first_ride).dt.total_days() // 7)
+                .cast(pl.Int64)
+                .alias("week_no"),
+            )
+            .select([name for name, _ in columns])
+        )
+
+        return output_df
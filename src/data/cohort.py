@@ -0,0 +1,787 @@
+"""
+This file defines the Cohort class, an alternative to the Athlete class that computes metrics for many athletes at once.
+
+Instead of looping over athletes and rides in Python, every selected ride is exposed as one polars table with the
+columns athlete_id, activity_id, secs, power and hr. TRIMP, HR range, MMP and HRR are expressed as group-by and window
+queries over (athlete_id, activity_id, segment), so polars' query optimiser and thread pool see the whole cohort. Athletes
+are processed in batches: the ride files of a batch are read once with the streaming engine, and every metric query runs
+on the table in memory. The Hampel filter runs as a single vectorised numpy pass over each batch.
+
+benchmark() measures the rows per second and peak memory of each batch on synthetic rides.
+
+The outputs match those of Athlete.get_hr_min_max, Athlete.process_trimp, Athlete.process_mmp and Athlete.process_hrr,
+with the following differences:
+- The Hampel filter uses hampel_window_stats rather than rust_utils.hampel_filter, so windows that contain missing
+  heart rate values leave the value unchanged.
+- When several windows in a segment share the highest HRR(30) or maximal mean power, the earliest one is reported. The
+  Athlete class picks one of them arbitrarily.
+- Rows with missing values in columns outside the ride table (km, cad, alt) are kept by the HRR query.
+"""
+
+# Imports
+import time
+import tempfile
+import datetime as dt
+
+import numpy as np
+import polars as pl
+import polars.selectors as cs
+from opendata import OpenData
+from botocore.exceptions import ClientError
+
+from .athlete_class import K_MAD_SCALING_FACTOR, hampel_window_stats
+
+# The resource module is only available on Unix, where it is used to report peak memory use
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Creating an OpenData object
+od = OpenData()
+
+# Schema of the lazy table of ride data
+RIDE_SCHEMA = {
+    "athlete_id": pl.String,
+    "activity_id": pl.String,
+    "secs": pl.Float64,
+    "power": pl.Float64,
+    "hr": pl.Float64,
+}
+
+# Keys identifying a single activity
+ACTIVITY_KEYS = ["athlete_id", "activity_id"]
+
+# Upper limit of plausible heart rates by gender, as used in Athlete.get_hr_min_max
+HR_CUTOFFS = {"M": 215, "F": 210}
+
+# Weighting factor for Banister's TRIMP by gender, as used in ActivityFunctions.process_trimp
+TRIMP_WEIGHTS = {"M": 1.92, "F": 1.67}
+
+# Polars 1.23 introduced engine="streaming", older versions use the streaming flag instead
+STREAMING_ENGINE = tuple(int(part) for part in pl.__version__.split(".")[:2]) >= (1, 23)
+
+# Number of rows whose Hampel window medians are calculated at once, which bounds the memory used by the filter
+HAMPEL_CHUNK_ROWS = 1 << 16
+
+
+def collect_streaming(lf: pl.LazyFrame) -> pl.DataFrame:
+    """Collects a lazy frame using polars' streaming engine."""
+    if STREAMING_ENGINE:
+        return lf.collect(engine="streaming")
+    return lf.collect(streaming=True)
+
+
+def peak_rss_mb() -> float | None:
+    """Returns the peak resident memory of the process so far in MB, or None where the resource module is unavailable."""
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def hampel_kernel(
+    values: np.ndarray, has_window: np.ndarray, half_window: int, n_sigma: float
+) -> np.ndarray:
+    """Applies the Hampel filter to the rows of a column that have a complete window.
+
+    The column can hold many groups back to back. A row whose window lies entirely within its own group is marked in
+    has_window, so its window in the full column is the same as in the group, and the whole column is filtered in one
+    pass. The window medians are calculated HAMPEL_CHUNK_ROWS rows at a time with hampel_window_stats.
+    Args:
+        values (np.ndarray): The values of the column as floats, with NaN for missing values.
+        has_window (np.ndarray): A boolean array that is True for rows with a complete window within their group.
+        half_window (int): The number of values on either side of the centre of each window.
+        n_sigma (float): The threshold, in scaled MADs, above which a value is considered an outlier.
+
+    Returns:
+        np.ndarray: The filtered values.
+    """
+    filtered = values.copy()
+
+    # A window of a single value never changes it, matching rust_utils.hampel_filter
+    if half_window < 1:
+        return filtered
+
+    for start in range(half_window, values.size - half_window, HAMPEL_CHUNK_ROWS):
+        end = min(start + HAMPEL_CHUNK_ROWS, values.size - half_window)
+        medians, mads = hampel_window_stats(
+            values[start - half_window : end + half_window], half_window
+        )
+        outliers = has_window[start:end] & (
+            np.abs(values[start:end] - medians) > n_sigma * K_MAD_SCALING_FACTOR * mads
+        )
+        filtered[start:end][outliers] = medians[outliers]
+
+    return filtered
+
+
+def hampel_exprs(
+    col: str, half_window: int, n_sigma: float, over: list
+) -> tuple[pl.Expr, pl.Expr]:
+    """Returns expressions that apply the Hampel filter to a column within each group.
+
+    The filter runs hampel_kernel() once over the whole column, so the rows of each group must be contiguous, as they
+    are in the ride table returned by Cohort.load_rides(). Rows without a complete window, i.e. those within half_window
+    rows of either end of a group, keep their value, matching rust_utils.hampel_filter.
+    Args:
+        col (str): The column to filter.
+        half_window (int): The number of values on either side of the centre of each window.
+        n_sigma (float): The threshold, in scaled MADs, above which a value is considered an outlier.
+        over (list): The columns defining each group, e.g. a continuous segment of a ride.
+
+    Returns:
+        A tuple of expressions (has_window, filtered), where has_window is True for rows with a complete window.
+    """
+    row_no = pl.int_range(pl.len()).over(over)
+    has_window = (row_no >= half_window) & (row_no < pl.len().over(over) - half_window)
+
+    filtered = pl.struct(
+        pl.col(col).cast(pl.Float64).alias("values"), has_window.alias("has_window")
+    ).map_batches(
+        lambda s: pl.Series(
+            hampel_kernel(
+                s.struct.field("values").fill_null(np.nan).to_numpy(),
+                s.struct.field("has_window").to_numpy(),
+                half_window,
+                n_sigma,
+            )
+        ).fill_nan(None),
+        return_dtype=pl.Float64,
+    )
+
+    return has_window, filtered
+
+
+class Cohort:
+    def __init__(self, athlete_ids: list, athletes: pl.DataFrame | None = None):
+        """
+        Args:
+            athlete_ids (list): The athletes in the cohort.
+            athletes (pl.DataFrame): Optional table of known HR ranges with the columns id, max_hr and min_hr, e.g. data/processed/df_athletes_hrs_updated.csv. HR ranges of other athletes are calculated with hr_min_max_query().
+        """
+        self.athlete_ids = list(athlete_ids)
+        self.athletes = athletes
+        self.activities = None
+        self.batch_stats = None
+
+    def load_activities(self, athlete_ids: list | None = None) -> pl.DataFrame:
+        """Builds a table of activity metadata (athlete_id, activity_id, gender, date, sport, path) from local storage, fetching athletes from remote storage if needed."""
+        athlete_ids = self.athlete_ids if athlete_ids is None else athlete_ids
+        records = []
+
+        for athlete_id in athlete_ids:
+            athlete = od.get_local_athlete(athlete_id=athlete_id)
+
+            # If athlete data not found locally, fetch from remote storage and store locally before loading.
+            if not athlete.has_data():
+                try:
+                    od.get_remote_athlete(athlete_id=athlete_id).store_locally()
+                    athlete = od.get_local_athlete(athlete_id=athlete_id)
+                except ClientError as ex:
+                    if ex.response["Error"]["Code"] == "NoSuchKey":
+                        print(f"Athlete {athlete_id} not found! Skipping athlete.")
+                        continue
+                    raise
+
+            if athlete.metadata is None:
+                continue
+
+            gender = athlete.metadata["ATHLETE"]["gender"]
+            for activity in athlete.activities():
+                if activity.metadata is None or not activity.has_data():
+                    continue
+                records.append(
+                    {
+                        "athlete_id": athlete_id,
+                        "activity_id": activity.id,
+                        "gender": gender,
+                        "date": dt.datetime.strptime(
+                            activity.metadata["date"], r"%Y/%m/%d %H:%M:%S UTC"
+                        ),
+                        "sport": activity.metadata["sport"],
+                        "path": activity.filepath_or_buffer,
+                    }
+                )
+
+        return pl.DataFrame(
+            records,
+            schema={
+                "athlete_id": pl.String,
+                "activity_id": pl.String,
+                "gender": pl.String,
+                "date": pl.Datetime,
+                "sport": pl.String,
+                "path": pl.String,
+            },
+        )
+
+    def get_activities(self) -> pl.DataFrame:
+        """Returns the cohort's activity metadata, loading it on first use."""
+        if self.activities is None:
+            self.activities = self.load_activities()
+        return self.activities
+
+    @staticmethod
+    def scan_rides(activities: pl.DataFrame) -> pl.LazyFrame:
+        """Exposes every activity in the table as a single lazy table with the columns athlete_id, activity_id, secs, power and hr.
+        Args:
+            activities (pl.DataFrame): A table of activities with the columns athlete_id, activity_id and path.
+
+        Returns:
+            pl.LazyFrame: The ride data of all activities. Nothing is read until the frame is collected.
+        """
+        frames = [
+            pl.scan_csv(
+                path,
+                schema_overrides={
+                    "secs": pl.Float64,
+                    "power": pl.Float64,
+                    "hr": pl.Float64,
+                },
+            )
+            .select(cs.by_name("secs", "power", "hr", require_all=False))
+            .with_columns(
+                pl.lit(athlete_id).alias("athlete_id"),
+                pl.lit(activity_id).alias("activity_id"),
+            )
+            for athlete_id, activity_id, path in activities.select(
+                "athlete_id", "activity_id", "path"
+            ).iter_rows()
+        ]
+
+        # An empty frame with the full schema ensures every column exists even if no file contains it
+        return pl.concat(
+            [pl.LazyFrame(schema=RIDE_SCHEMA)] + frames, how="diagonal_relaxed"
+        ).select([pl.col(name).cast(dtype) for name, dtype in RIDE_SCHEMA.items()])
+
+    @staticmethod
+    def load_rides(activities: pl.DataFrame) -> pl.DataFrame:
+        """Reads the ride data of every activity in the table into memory with the streaming engine.
+
+        The metric queries are run on this table, so each file is only read once per batch. The rows of each activity
+        are kept together and in their original order, as required by hampel_exprs().
+        Args:
+            activities (pl.DataFrame): A table of activities with the columns athlete_id, activity_id and path.
+
+        Returns:
+            pl.DataFrame: The ride data of all activities, in the format of scan_rides().
+        """
+        return collect_streaming(Cohort.scan_rides(activities)).sort(
+            ACTIVITY_KEYS, maintain_order=True
+        )
+
+    @staticmethod
+    def first_rides(activities: pl.DataFrame) -> pl.DataFrame:
+        """Returns the date of each athlete's first bike ride, used to number weeks."""
+        return (
+            activities.filter(pl.col("sport") == "Bike")
+            .group_by("athlete_id")
+            .agg(pl.col("date").min().alias("date_of_first_ride"))
+        )
+
+    @staticmethod
+    def hr_min_max_query(rides: pl.LazyFrame, activities: pl.DataFrame) -> pl.LazyFrame:
+        """Builds the query for each athlete's minimum and maximum HR, as in Athlete.get_hr_min_max.
+
+        The minimum and maximum plausible HR of every activity are collected, and the athlete's HR min and max are the 5th and 95th percentiles of these, provided they have at least 20 activities with readings.
+        """
+        cutoffs = activities.select(
+            "athlete_id",
+            "activity_id",
+            pl.col("gender")
+            .replace_strict(HR_CUTOFFS, return_dtype=pl.Float64)
+            .alias("cutoff"),
+        )
+
+        return (
+            rides.join(
+                cutoffs.lazy(), on=ACTIVITY_KEYS, how="inner", maintain_order="left"
+            )
+            .filter(pl.col("hr") >= 40, pl.col("hr") <= pl.col("cutoff"))
+            .group_by(ACTIVITY_KEYS)
+            .agg(
+                pl.col("hr").max().alias("activity_max_hr"),
+                pl.col("hr").min().alias("activity_min_hr"),
+            )
+            .group_by("athlete_id")
+            .agg(
+                pl.len().alias("no_of_readings"),
+                pl.col("activity_max_hr")
+                .quantile(0.95, interpolation="linear")
+                .alias("max_hr"),
+                pl.col("activity_min_hr")
+                .quantile(0.05, interpolation="linear")
+                .alias("min_hr"),
+            )
+            .filter(pl.col("no_of_readings") >= 20)
+            .select("athlete_id", "max_hr", "min_hr")
+        )
+
+    @staticmethod
+    def trimp_query(
+        rides: pl.LazyFrame, activities: pl.DataFrame, hr_ranges: pl.DataFrame
+    ) -> pl.LazyFrame:
+        """Builds the query for weekly TRIMP, as in Athlete.process_trimp."""
+        activity_info = (
+            activities.join(hr_ranges, on="athlete_id", how="inner")
+            .join(Cohort.first_rides(activities), on="athlete_id", how="inner")
+            .select(
+                *ACTIVITY_KEYS,
+                "gender",
+                "date",
+                "date_of_first_ride",
+                "max_hr",
+                "min_hr",
+                pl.col("gender")
+                .replace_strict(TRIMP_WEIGHTS, return_dtype=pl.Float64)
+                .alias("Y"),
+            )
+        )
+
+        return (
+            rides.filter(pl.col("hr") >= 25)
+            .group_by(ACTIVITY_KEYS)
+            .agg(
+                pl.col("hr").mean().alias("hr_mean"),
+                (pl.len() / 60).alias("duration"),
+            )
+            .join(activity_info.lazy(), on=ACTIVITY_KEYS, how="inner")
+            .with_columns(
+                (
+                    pl.col("duration")
+                    * (pl.col("hr_mean") - pl.col("min_hr"))
+                    / (pl.col("max_hr") - pl.col("min_hr"))
+                    * pl.col("Y")
+                ).alias("trimp"),
+                (
+                    (pl.col("date") - pl.col("date_of_first_ride")).dt.total_days() // 7
+                ).alias("week_no"),
+            )
+            .group_by(["athlete_id", "gender", "week_no"])
+            .agg(pl.sum("trimp").alias("total_weekly_trimp"))
+            .sort(["athlete_id", "week_no"])
+        )
+
+    @staticmethod
+    def mmp_query(
+        rides: pl.LazyFrame,
+        activities: pl.DataFrame,
+        hr_ranges: pl.DataFrame,
+        hr_threshold: float,
+        window_len: int,
+        half_window: int = 10,
+        n_sigma: float = 3.0,
+    ) -> pl.LazyFrame:
+        """Builds the query for maximal mean power over window_len minutes, as in Athlete.process_mmp."""
+        window_size = window_len * 60
+        segment_keys = ACTIVITY_KEYS + ["segment_id"]
+
+        bike_rides = activities.filter(pl.col("sport") == "Bike").join(
+            hr_ranges.select("athlete_id", "max_hr"), on="athlete_id", how="inner"
+        )
+        _, hr_filtered = hampel_exprs("hr", half_window, n_sigma, ACTIVITY_KEYS)
+
+        return (
+            rides.join(
+                bike_rides.select(*ACTIVITY_KEYS, "max_hr").lazy(),
+                on=ACTIVITY_KEYS,
+                how="inner",
+                maintain_order="left",
+            )
+            # Skipping activities without any heart rate or power data
+            .filter(
+                pl.col("hr").is_not_null().any().over(ACTIVITY_KEYS),
+                pl.col("power").is_not_null().any().over(ACTIVITY_KEYS),
+            )
+            .with_columns(hr_filtered.alias("hr"))
+            # Identifying continuous segments and filtering out those that are too short
+            .with_columns(
+                pl.col("secs")
+                .diff()
+                .ne(1)
+                .cum_sum()
+                .over(ACTIVITY_KEYS)
+                .alias("segment_id")
+            )
+            .filter(pl.len().over(segment_keys) >= window_size)
+            .with_columns(
+                pl.col("power")
+                .rolling_mean(window_size)
+                .over(segment_keys)
+                .alias("rolling_mean_power"),
+                pl.col("hr")
+                .rolling_mean(window_size)
+                .over(segment_keys)
+                .alias("rolling_mean_hr"),
+            )
+            .filter(
+                pl.col("rolling_mean_power").is_not_null(),
+                pl.col("rolling_mean_hr") >= pl.col("max_hr") * hr_threshold,
+            )
+            # Selecting the window with the highest mean power in each segment
+            .group_by(segment_keys)
+            .agg(
+                pl.col("secs", "rolling_mean_power")
+                .sort_by(["rolling_mean_power", "secs"], descending=[True, False])
+                .first()
+            )
+            .join(
+                bike_rides.select(*ACTIVITY_KEYS, "gender", "date").lazy(),
+                on=ACTIVITY_KEYS,
+                how="inner",
+            )
+            .join(Cohort.first_rides(activities).lazy(), on="athlete_id", how="inner")
+            .select(
+                "athlete_id",
+                "gender",
+                ((pl.col("date") - pl.col("date_of_first_ride")).dt.total_days() // 7)
+                .cast(pl.Int64)
+                .alias("week_no"),
+                "activity_id",
+                pl.col("date").cast(pl.Datetime),
+                (pl.col("secs") - window_size)
+                .cast(pl.Int64)
+                .alias("mmp_window_start_secs"),
+                pl.col("secs").cast(pl.Int64).alias("mmp_window_end_secs"),
+                pl.col("rolling_mean_power")
+                .cast(pl.Float64)
+                .alias("maximal_mean_power"),
+            )
+            .sort(["athlete_id", "date", "mmp_window_end_secs"])
+        )
+
+    @staticmethod
+    def hrr_query(
+        rides: pl.LazyFrame,
+        activities: pl.DataFrame,
+        hr_ranges: pl.DataFrame,
+        hr_threshold: float = 0.8,
+        half_window: int = 10,
+        n_sigma: float = 3.0,
+    ) -> pl.LazyFrame:
+        """Builds the query for HRR(30) windows, as in Athlete.process_hrr."""
+        sequence_keys = ACTIVITY_KEYS + ["sequence_number"]
+
+        bike_rides = activities.filter(pl.col("sport") == "Bike").join(
+            hr_ranges.select("athlete_id", "max_hr"), on="athlete_id", how="inner"
+        )
+        has_window, hr_filtered = hampel_exprs(
+            "hr", half_window, n_sigma, sequence_keys
+        )
+
+        return (
+            rides.join(
+                bike_rides.select(*ACTIVITY_KEYS, "max_hr").lazy(),
+                on=ACTIVITY_KEYS,
+                how="inner",
+                maintain_order="left",
+            )
+            # Keeping only rows with low power output and plausible HR values
+            .filter(pl.col("power") <= 20, pl.col("hr") >= 25)
+            # Identifying continuous sequences that are at least 30 rows long
+            .with_columns(
+                pl.col("secs")
+                .diff()
+                .fill_null(1)
+                .ne(1)
+                .cum_sum()
+                .over(ACTIVITY_KEYS)
+                .alias("sequence_number")
+            )
+            .filter(pl.len().over(sequence_keys) >= 30)
+            # Applying the Hampel filter and dropping the rows at either end of each sequence, which cannot be filtered
+            .with_columns(has_window.alias("has_window"), hr_filtered.alias("hr"))
+            .filter(pl.col("has_window"))
+            .with_columns(
+                pl.col("hr").diff().fill_null(0).over(sequence_keys).alias("hr_delta")
+            )
+            # Calculating HR decrease over 30 seconds and the HR at the start of each window
+            .with_columns(
+                (-pl.col("hr_delta"))
+                .rolling_sum(window_size=30, min_samples=30)
+                .over(sequence_keys)
+                .alias("hr_drop_in_30s_window"),
+                pl.col("hr").shift(29).over(sequence_keys).alias("hr_at_window_start"),
+            )
+            .filter(
+                pl.col("hr_drop_in_30s_window").is_not_null(),
+                pl.col("hr_drop_in_30s_window") >= 0,
+                pl.col("hr_at_window_start") >= hr_threshold * pl.col("max_hr"),
+            )
+            # Selecting the largest decrease in each sequence
+            .group_by(sequence_keys)
+            .agg(
+                pl.col("secs", "hr_drop_in_30s_window")
+                .sort_by(["hr_drop_in_30s_window", "secs"], descending=[True, False])
+                .first()
+            )
+            .join(
+                bike_rides.select(*ACTIVITY_KEYS, "gender", "date").lazy(),
+                on=ACTIVITY_KEYS,
+                how="inner",
+            )
+            .join(Cohort.first_rides(activities).lazy(), on="athlete_id", how="inner")
+            .select(
+                "athlete_id",
+                "gender",
+                ((pl.col("date") - pl.col("date_of_first_ride")).dt.total_days() // 7)
+                .cast(pl.Int64)
+                .alias("week_no"),
+                "activity_id",
+                "date",
+                (pl.col("secs") - 29).cast(pl.Int64).alias("hrr_window_start_secs"),
+                pl.col("secs").cast(pl.Int64).alias("hrr_window_end_secs"),
+                pl.col("hr_drop_in_30s_window").cast(pl.Int64).alias("HRR(30)"),
+            )
+            .sort(["athlete_id", "date", "hrr_window_start_secs"])
+        )
+
+    def hr_ranges(
+        self, activities: pl.DataFrame, rides: pl.LazyFrame | None = None
+    ) -> pl.DataFrame:
+        """Returns the HR min and max of the athletes in the activity table, using known values where available.
+        Args:
+            activities (pl.DataFrame): A table of activities, as returned by load_activities().
+            rides (pl.LazyFrame): Optional ride data of the activities, e.g. from load_rides(). The files are scanned if not given.
+
+        Returns:
+            pl.DataFrame: The columns athlete_id, max_hr and min_hr.
+        """
+        athlete_ids = activities["athlete_id"].unique()
+        known = pl.DataFrame(
+            schema={"athlete_id": pl.String, "max_hr": pl.Float64, "min_hr": pl.Float64}
+        )
+        if self.athletes is not None:
+            known = (
+                self.athletes.select(
+                    pl.col("id").cast(pl.String).alias("athlete_id"),
+                    pl.col("max_hr").cast(pl.Float64),
+                    pl.col("min_hr").cast(pl.Float64),
+                )
+                .drop_nulls()
+                .filter(pl.col("athlete_id").is_in(athlete_ids))
+            )
+
+        unknown = activities.filter(~pl.col("athlete_id").is_in(known["athlete_id"]))
+        if unknown.is_empty():
+            return known
+
+        if rides is None:
+            rides = self.scan_rides(unknown)
+        calculated = collect_streaming(self.hr_min_max_query(rides, unknown))
+        return pl.concat([known, calculated.select(known.columns)])
+
+    def process_batch(
+        self,
+        rides: pl.LazyFrame,
+        activities: pl.DataFrame,
+        metrics: list,
+        hr_threshold: float,
+        window_len: int,
+        hrr_threshold: float,
+    ) -> dict:
+        """Computes the selected metrics for a batch of activities whose ride data has been loaded.
+        Args:
+            rides (pl.LazyFrame): The ride data of the activities, e.g. from load_rides().
+            activities (pl.DataFrame): The activities in the batch.
+            metrics (list): Any of "hr_range", "trimp", "mmp" and "hrr".
+            hr_threshold (float): The HR threshold for maximal mean power.
+            window_len (int): The window size in minutes for maximal mean power.
+            hrr_threshold (float): The threshold of maximum HR that the HR at the start of an HRR window must reach.
+
+        Returns:
+            dict: A dictionary mapping each metric to a polars dataframe.
+        """
+        hr_ranges = self.hr_ranges(activities, rides)
+        results = {}
+
+        if "hr_range" in metrics:
+            results["hr_range"] = hr_ranges
+        if "trimp" in metrics:
+            results["trimp"] = collect_streaming(
+                self.trimp_query(rides, activities, hr_ranges)
+            )
+        if "mmp" in metrics:
+            results["mmp"] = collect_streaming(
+                self.mmp_query(rides, activities, hr_ranges, hr_threshold, window_len)
+            )
+        if "hrr" in metrics:
+            results["hrr"] = collect_streaming(
+                self.hrr_query(rides, activities, hr_ranges, hrr_threshold)
+            )
+
+        return results
+
+    def process(
+        self,
+        metrics: list = ["hr_range", "trimp", "mmp", "hrr"],
+        hr_threshold: float = 0.85,
+        window_len: int = 4,
+        hrr_threshold: float = 0.8,
+        batch_size: int = 10,
+    ) -> dict:
+        """Computes the selected metrics for every athlete in the cohort, one batch of athletes at a time.
+
+        The ride data of each batch is read once with load_rides() and shared by every metric query. The number of rows,
+        time taken, throughput and peak memory use of each batch are stored in the batch_stats attribute.
+        Args:
+            metrics (list): Any of "hr_range", "trimp", "mmp" and "hrr".
+            hr_threshold (float): The HR threshold for maximal mean power, as in Athlete.process_mmp.
+            window_len (int): The window size in minutes for maximal mean power.
+            hrr_threshold (float): The threshold of maximum HR that the HR at the start of an HRR window must reach.
+            batch_size (int): The number of athletes whose ride data is held in memory together. Larger batches use more memory.
+
+        Returns:
+            dict: A dictionary mapping each metric to a polars dataframe in the format returned by the Athlete class.
+        """
+        activities = self.get_activities()
+        results = {metric: [] for metric in metrics}
+        batch_stats = []
+
+        for start in range(0, len(self.athlete_ids), batch_size):
+            batch_ids = self.athlete_ids[start : start + batch_size]
+            batch_activities = activities.filter(pl.col("athlete_id").is_in(batch_ids))
+            if batch_activities.is_empty():
+                continue
+
+            batch_start = time.perf_counter()
+            df_rides = self.load_rides(batch_activities)
+            rides = df_rides.lazy()
+            batch_results = self.process_batch(
+                rides,
+                batch_activities,
+                metrics,
+                hr_threshold,
+                window_len,
+                hrr_threshold,
+            )
+            for metric, df in batch_results.items():
+                results[metric].append(df)
+
+            seconds = time.perf_counter() - batch_start
+            batch_stats.append(
+                {
+                    "athletes": batch_activities["athlete_id"].n_unique(),
+                    "activities": batch_activities.height,
+                    "rows": df_rides.height,
+                    "seconds": seconds,
+                    "rows_per_second": df_rides.height / seconds,
+                    "peak_rss_mb": peak_rss_mb(),
+                }
+            )
+            print(
+                f"Processed {min(start + batch_size, len(self.athlete_ids))} of {len(self.athlete_ids)} athletes: "
+                f"{df_rides.height} rows in {seconds:.2f} s ({df_rides.height / seconds:,.0f} rows/s)."
+            )
+
+        self.batch_stats = pl.DataFrame(batch_stats)
+
+        # Metrics without any batch are calculated on an empty ride table, which gives an empty frame with the right schema
+        missing = [metric for metric, dfs in results.items() if dfs == []]
+        if missing:
+            empty_results = self.process_batch(
+                pl.LazyFrame(schema=RIDE_SCHEMA),
+                activities.clear(),
+                missing,
+                hr_threshold,
+                window_len,
+                hrr_threshold,
+            )
+            for metric, df in empty_results.items():
+                results[metric].append(df)
+
+        return {metric: pl.concat(dfs) for metric, dfs in results.items()}
+
+
+def write_synthetic_rides(
+    output_dir, n_athletes: int, rides_per_athlete: int, ride_secs: int, seed: int = 0
+) -> pl.DataFrame:
+    """Writes synthetic one-second ride files in the Golden Cheetah CSV format, for benchmarking.
+
+    Each ride alternates between efforts and recoveries, with heart rate following power and occasional spikes and
+    dropouts for the Hampel filter to remove.
+    Args:
+        output_dir: The directory the CSV files are written to.
+        n_athletes (int): The number of athletes.
+        rides_per_athlete (int): The number of rides per athlete.
+        ride_secs (int): The length of each ride in seconds.
+        seed (int): The seed of the random number generator.
+
+    Returns:
+        pl.DataFrame: A table of the activities in the format returned by Cohort.load_activities().
+    """
+    rng = np.random.default_rng(seed)
+    secs = np.arange(ride_secs)
+    records = []
+
+    for athlete_no in range(n_athletes):
+        athlete_id = f"synthetic_{athlete_no}"
+        gender = "M" if athlete_no % 2 == 0 else "F"
+        for ride_no in range(rides_per_athlete):
+            effort = (secs // rng.integers(120, 600)) % 2 == 0
+            power = np.where(effort, rng.normal(250, 40, ride_secs), 0).clip(0)
+            hr = 110 + 60 * effort + rng.normal(0, 2, ride_secs)
+            hr = np.array(pl.Series(hr).ewm_mean(alpha=0.02))
+            hr[rng.integers(0, ride_secs, ride_secs // 200)] = rng.choice(
+                [0, 230], ride_secs // 200
+            )
+
+            date = dt.datetime(2020, 1, 1) + dt.timedelta(days=2 * ride_no)
+            activity_id = date.strftime(r"%Y_%m_%d_%H_%M_%S.csv")
+            path = f"{output_dir}/{athlete_id}_{activity_id}"
+            pl.DataFrame(
+                {
+                    "secs": secs,
+                    "km": secs * 0.01,
+                    "power": power.round(),
+                    "hr": hr.round(),
+                    "cad": 85,
+                    "alt": 100.0,
+                }
+            ).write_csv(path)
+
+            records.append(
+                {
+                    "athlete_id": athlete_id,
+                    "activity_id": activity_id,
+                    "gender": gender,
+                    "date": date,
+                    "sport": "Bike",
+                    "path": path,
+                }
+            )
+
+    return pl.DataFrame(records)
+
+
+def benchmark(
+    n_athletes: int = 4,
+    rides_per_athlete: int = 40,
+    ride_secs: int = 3600,
+    batch_size: int = 1,
+    metrics: list = ["hr_range", "trimp", "mmp", "hrr"],
+) -> pl.DataFrame:
+    """Measures the throughput and peak memory use of Cohort.process on synthetic rides.
+    Args:
+        n_athletes (int): The number of synthetic athletes.
+        rides_per_athlete (int): The number of rides per athlete.
+        ride_secs (int): The length of each ride in seconds.
+        batch_size (int): The number of athletes processed together.
+        metrics (list): The metrics to calculate.
+
+    Returns:
+        pl.DataFrame: The batch_stats of the run, with one row per batch.
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        activities = write_synthetic_rides(
+            output_dir, n_athletes, rides_per_athlete, ride_secs
+        )
+        cohort = Cohort(activities["athlete_id"].unique(maintain_order=True))
+        cohort.activities = activities
+        cohort.process(metrics=metrics, batch_size=batch_size)
+
+    with pl.Config(tbl_cols=-1, tbl_width_chars=120):
+        print(cohort.batch_stats)
+
+    return cohort.batch_stats
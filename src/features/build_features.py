@@ -0,0 +1,169 @@
+"""
+This file contains functions to turn the weekly metrics in data/processed/final_df.csv into features for modelling.
+
+The lag, difference and min-max scaling steps follow notebooks/0.07_modelling.ipynb. The scaled dataframe can be saved
+as a numpy feature matrix with write_feature_matrix() so that training scripts can memory-map it instead of rebuilding it.
+"""
+
+# Imports
+import json
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+# The lookback periods in weeks
+LAGS = [1, 2, 4]
+
+# The weekly metrics that lags and differences are calculated for
+VALUE_COLS = ["50_HRR(30)", "75_HRR(30)", "MMP_max", "TRIMP"]
+
+# Columns identifying each row rather than describing it
+KEY_COLS = ["athlete_id", "gender", "week_no"]
+
+
+def file_hash(path) -> str:
+    """Returns the SHA-256 hash of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def add_lags_and_diffs(
+    df: pl.DataFrame, lags: list = LAGS, value_cols: list = VALUE_COLS
+) -> pl.DataFrame:
+    """Adds lagged values and differences from the lagged values for each weekly metric.
+    Args:
+        df (pl.DataFrame): A dataframe in the format of data/processed/final_df.csv.
+        lags (list): The lookback periods in weeks.
+        value_cols (list): The columns to calculate lags and differences for.
+
+    Returns:
+        pl.DataFrame: The input dataframe with {col}_lag_{lag} and {col}_diff_{lag} columns added.
+    """
+    df_with_lags = df.clone()
+
+    # Joining on the future week number so that each row receives the value from lag weeks earlier
+    for lag in lags:
+        df_lagged = (
+            df.select(KEY_COLS + value_cols)
+            .with_columns(pl.col("week_no") + lag)
+            .rename({col: f"{col}_lag_{lag}" for col in value_cols})
+        )
+        df_with_lags = df_with_lags.join(df_lagged, on=KEY_COLS, how="left")
+
+    diff_expressions = [
+        (pl.col(col) - pl.col(f"{col}_lag_{lag}")).alias(f"{col}_diff_{lag}")
+        for col in value_cols
+        for lag in lags
+    ]
+
+    return df_with_lags.with_columns(diff_expressions)
+
+
+def min_max_scale(df: pl.DataFrame, cols: list) -> pl.DataFrame:
+    """Adds a {col}_scaled column for each column, min-max scaled within each athlete.
+    Args:
+        df (pl.DataFrame): The dataframe to scale.
+        cols (list): The columns to scale.
+
+    Returns:
+        pl.DataFrame: The input dataframe with the scaled columns added.
+    """
+    scaling_exprs = []
+    for col_name in cols:
+        min_val = pl.col(col_name).min().over("athlete_id")
+        max_val = pl.col(col_name).max().over("athlete_id")
+
+        # If max == min, the scaled value is 0
+        expr = (
+            pl.when((max_val - min_val) == 0)
+            .then(pl.lit(0.0))
+            .otherwise((pl.col(col_name) - min_val) / (max_val - min_val))
+            .alias(f"{col_name}_scaled")
+        )
+        scaling_exprs.append(expr)
+
+    return df.with_columns(scaling_exprs)
+
+
+def build_features(
+    df: pl.DataFrame, lags: list = LAGS, value_cols: list = VALUE_COLS
+) -> pl.DataFrame:
+    """Builds the scaled feature dataframe saved as data/processed/final_df_scaled.csv.
+    Args:
+        df (pl.DataFrame): A dataframe in the format of data/processed/final_df.csv.
+        lags (list): The lookback periods in weeks.
+        value_cols (list): The weekly metrics to build features from.
+
+    Returns:
+        pl.DataFrame: The dataframe with binary encoded gender, lags, differences and scaled columns.
+    """
+    # Binary encoding of gender, 0 for males and 1 for females
+    if df.schema["gender"] == pl.String:
+        df = df.with_columns((pl.col("gender") == "F").cast(pl.Int8).alias("gender"))
+
+    df = add_lags_and_diffs(df, lags=lags, value_cols=value_cols)
+
+    cols_to_scale = (
+        value_cols
+        + [f"{col}_lag_{lag}" for col in value_cols for lag in lags]
+        + [f"{col}_diff_{lag}" for col in value_cols for lag in lags]
+    )
+
+    return min_max_scale(df, cols_to_scale)
+
+
+def write_feature_matrix(df: pl.DataFrame, path, source_hash: str | None = None):
+    """Saves a feature dataframe as a float64 numpy matrix that can be memory-mapped.
+
+    Three files are written next to each other:
+    - {path}.npy: The numeric columns as a 2D float64 array, with nulls stored as NaN.
+    - {path}_groups.npy: An integer code per row identifying the athlete.
+    - {path}.json: The column names, athlete ids and the hash of the source data.
+
+    Args:
+        df (pl.DataFrame): The feature dataframe, e.g. the output of build_features().
+        path: The path of the matrix, without a suffix.
+        source_hash (str): Optional hash of the file the features were built from.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    columns = [col for col in df.columns if col != "athlete_id"]
+    athlete_ids = df["athlete_id"].unique(maintain_order=True)
+
+    matrix = df.select(pl.col(columns).cast(pl.Float64)).to_numpy()
+    groups = (
+        df.select(
+            pl.col("athlete_id").replace_strict(
+                athlete_ids, pl.int_range(len(athlete_ids), eager=True)
+            )
+        )
+        .to_series()
+        .to_numpy()
+    )
+
+    np.save(path.with_suffix(".npy"), np.ascontiguousarray(matrix))
+    np.save(path.parent / f"{path.name}_groups.npy", groups)
+    with open(path.with_suffix(".json"), "w") as f:
+        json.dump(
+            {
+                "columns": columns,
+                "athlete_ids": athlete_ids.to_list(),
+                "source_hash": source_hash,
+            },
+            f,
+        )
+
+
+if __name__ == "__main__":
+    project_dir = Path(__file__).resolve().parents[2]
+    source = project_dir / "data" / "processed" / "final_df.csv"
+
+    df_scaled = build_features(pl.read_csv(source))
+    df_scaled.write_csv(project_dir / "data" / "processed" / "final_df_scaled.csv")
+    print(f"Saved {df_scaled.height} rows of features.")
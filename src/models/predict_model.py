@@ -0,0 +1,490 @@
+"""
+This script scores the next week for many athletes at once without reprocessing their full history.
+
+Each athlete is represented by a small state snapshot:
+- history: The last 4 weeks of weekly metrics (50_HRR(30), 75_HRR(30), MMP_max and TRIMP), which is all the lags need.
+- bounds: The per-athlete min and max of every scaled column, used for min-max scaling as in build_features.py.
+
+The state is updated incrementally from newly processed weeks in the format of data/processed/final_df.csv. Scoring
+builds the lag features for every requested athlete in one polars query and calls the model once for the whole batch.
+Models are loaded together with the features and target saved by train_model.py --refit, and predictions of a scaled
+target are returned in the units of the original column.
+
+Run from the project root with: python -m src.models.predict_model --help
+"""
+
+# Imports
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import joblib
+import numpy as np
+import polars as pl
+
+from src.features.build_features import LAGS, VALUE_COLS, add_lags_and_diffs
+
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+
+# Default locations of the input data and the saved state
+WEEKLY_CSV = PROJECT_DIR / "data" / "processed" / "final_df.csv"
+STATE_DIR = PROJECT_DIR / "models" / "state"
+
+# Number of weeks of history kept per athlete, i.e. the longest lag
+HISTORY_WEEKS = max(LAGS)
+
+# Columns that are min-max scaled, in the same order as build_features.py
+SCALED_COLS = (
+    VALUE_COLS
+    + [f"{col}_lag_{lag}" for col in VALUE_COLS for lag in LAGS]
+    + [f"{col}_diff_{lag}" for col in VALUE_COLS for lag in LAGS]
+)
+
+
+def _encode_weeks(df_weeks: pl.DataFrame) -> pl.DataFrame:
+    """Selects the weekly metric columns and encodes gender as 0 for males and 1 for females."""
+    if df_weeks.schema["gender"] == pl.String:
+        df_weeks = df_weeks.with_columns(
+            (pl.col("gender") == "F").cast(pl.Int8).alias("gender")
+        )
+    return df_weeks.select(
+        pl.col("athlete_id").cast(pl.String),
+        pl.col("gender").cast(pl.Int8),
+        pl.col("week_no").cast(pl.Int64),
+        *[pl.col(col).cast(pl.Float64) for col in VALUE_COLS],
+    )
+
+
+def _trim_history(history: pl.DataFrame) -> pl.DataFrame:
+    """Keeps the last HISTORY_WEEKS weeks for each athlete."""
+    return history.filter(
+        pl.col("week_no") > pl.col("week_no").max().over("athlete_id") - HISTORY_WEEKS
+    ).sort(["athlete_id", "week_no"])
+
+
+class PredictionState:
+    def __init__(self, history: pl.DataFrame, bounds: pl.DataFrame):
+        self.history = history
+        self.bounds = bounds
+
+    @classmethod
+    def from_weekly(cls, df_weekly: pl.DataFrame):
+        """Builds the state from the full weekly history, e.g. data/processed/final_df.csv."""
+        df_weekly = _encode_weeks(df_weekly)
+        df_features = add_lags_and_diffs(df_weekly)
+
+        bounds = df_features.group_by("athlete_id").agg(
+            *[pl.col(col).min().alias(f"{col}_min") for col in SCALED_COLS],
+            *[pl.col(col).max().alias(f"{col}_max") for col in SCALED_COLS],
+        )
+
+        return cls(_trim_history(df_weekly), bounds)
+
+    def update(self, df_new_weeks: pl.DataFrame):
+        """Adds newly processed weeks to the state, updating the history and scaling bounds.
+
+        The bounds are running minimums and maximums, so a week cannot be replaced or inserted before an athlete's latest
+        week without the full history. Such corrections need the state to be rebuilt with from_weekly().
+        Args:
+            df_new_weeks (pl.DataFrame): New weekly rows in the format of data/processed/final_df.csv. Each week must be newer than the athlete's latest week in the state.
+        """
+        df_new_weeks = _encode_weeks(df_new_weeks).unique(
+            subset=["athlete_id", "week_no"], keep="last", maintain_order=True
+        )
+
+        stale_weeks = df_new_weeks.join(
+            self.history.group_by("athlete_id").agg(
+                pl.col("week_no").max().alias("latest_week_no")
+            ),
+            on="athlete_id",
+            how="inner",
+        ).filter(pl.col("week_no") <= pl.col("latest_week_no"))
+        if not stale_weeks.is_empty():
+            raise ValueError(
+                f"{stale_weeks.height} rows are not newer than the athlete's latest week in the state, e.g. "
+                f"{stale_weeks.select('athlete_id', 'week_no', 'latest_week_no').row(0)}. "
+                "Rebuild the state with from_weekly() to correct past weeks."
+            )
+
+        # Only the history of the athletes being updated is needed to calculate lags and differences
+        df_combined = pl.concat(
+            [
+                self.history.filter(
+                    pl.col("athlete_id").is_in(df_new_weeks["athlete_id"].unique())
+                ),
+                df_new_weeks,
+            ]
+        )
+        df_features = add_lags_and_diffs(df_combined).join(
+            df_new_weeks.select("athlete_id", "week_no"),
+            on=["athlete_id", "week_no"],
+            how="semi",
+        )
+
+        # Folding the new rows into the running min and max of every scaled column
+        new_bounds = df_features.group_by("athlete_id").agg(
+            *[pl.col(col).min().alias(f"{col}_min") for col in SCALED_COLS],
+            *[pl.col(col).max().alias(f"{col}_max") for col in SCALED_COLS],
+        )
+        bounds = self.bounds.join(
+            new_bounds, on="athlete_id", how="full", coalesce=True
+        ).select(
+            "athlete_id",
+            *[
+                pl.min_horizontal(f"{col}_min", f"{col}_min_right").alias(f"{col}_min")
+                for col in SCALED_COLS
+            ],
+            *[
+                pl.max_horizontal(f"{col}_max", f"{col}_max_right").alias(f"{col}_max")
+                for col in SCALED_COLS
+            ],
+        )
+
+        self.history = _trim_history(pl.concat([self.history, df_new_weeks]))
+        self.bounds = bounds
+
+    def features(
+        self, athlete_ids: list | None = None, columns: list | None = None
+    ) -> pl.DataFrame:
+        """Builds the lag features, unscaled and scaled, for the week after each athlete's latest week.
+        Args:
+            athlete_ids (list): Optional list of athletes. Defaults to every athlete in the state.
+            columns (list): Optional list of feature columns to return, e.g. the features a model was trained on. Defaults to every feature.
+
+        Returns:
+            pl.DataFrame: One row per athlete with athlete_id, week_no (the week being scored) and the feature columns.
+        """
+        history = self.history
+        if athlete_ids is not None:
+            history = history.filter(pl.col("athlete_id").is_in(athlete_ids))
+
+        df = history.group_by("athlete_id", maintain_order=True).agg(
+            pl.col("gender").last(),
+            (pl.col("week_no").max() + 1).alias("week_no"),
+        )
+
+        # The lag columns for the target week are the values from lag weeks earlier
+        for lag in LAGS:
+            df = df.join(
+                history.select(
+                    "athlete_id",
+                    pl.col("week_no") + lag,
+                    *[pl.col(col).alias(f"{col}_lag_{lag}") for col in VALUE_COLS],
+                ),
+                on=["athlete_id", "week_no"],
+                how="left",
+            )
+
+        df = df.join(self.bounds, on="athlete_id", how="left")
+
+        lag_cols = [f"{col}_lag_{lag}" for col in VALUE_COLS for lag in LAGS]
+        scaling_exprs = []
+        for col_name in lag_cols:
+            min_val = pl.col(f"{col_name}_min")
+            max_val = pl.col(f"{col_name}_max")
+            scaling_exprs.append(
+                pl.when((max_val - min_val) == 0)
+                .then(pl.lit(0.0))
+                .otherwise((pl.col(col_name) - min_val) / (max_val - min_val))
+                .alias(f"{col_name}_scaled")
+            )
+
+        available = ["gender"] + lag_cols + [f"{col}_scaled" for col in lag_cols]
+        columns = columns or available
+
+        # Differences and current week values depend on the week being scored, so they cannot be used as features
+        missing = [col for col in columns if col not in available]
+        if missing:
+            raise ValueError(
+                f"Features {missing} cannot be built from the state. Available features are {available}."
+            )
+
+        return df.with_columns(scaling_exprs).select(
+            ["athlete_id", "week_no"] + columns
+        )
+
+    def save(self, state_dir=STATE_DIR):
+        """Saves the state as parquet files."""
+        state_dir = Path(state_dir)
+        state_dir.mkdir(parents=True, exist_ok=True)
+        self.history.write_parquet(state_dir / "history.parquet")
+        self.bounds.write_parquet(state_dir / "bounds.parquet")
+
+    @classmethod
+    def load(cls, state_dir=STATE_DIR):
+        """Loads a state saved with save()."""
+        state_dir = Path(state_dir)
+        return cls(
+            pl.read_parquet(state_dir / "history.parquet"),
+            pl.read_parquet(state_dir / "bounds.parquet"),
+        )
+
+
+def load_model(model_path):
+    """Loads a model saved by train_model.py --refit together with the features and target it was trained on.
+    Args:
+        model_path: The path of the model saved with joblib. The metadata is read from the .json file next to it.
+
+    Returns:
+        A tuple (model, metadata) where metadata contains the features and target.
+    """
+    model_path = Path(model_path)
+    metadata_path = model_path.with_suffix(".json")
+    if not metadata_path.exists():
+        raise FileNotFoundError(
+            f"No feature list found at {metadata_path}. Train the model with python -m src.models.train_model --refit."
+        )
+
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+
+    return joblib.load(model_path), metadata
+
+
+def score(
+    state: PredictionState, model, metadata: dict, athlete_ids: list | None = None
+) -> pl.DataFrame:
+    """Scores the next week for a batch of athletes with a single call to the model.
+
+    If the model was trained on a min-max scaled target such as MMP_max_scaled, the predictions are converted back to the
+    units of the original column with the athlete's bounds.
+    Args:
+        state (PredictionState): The athletes' state.
+        model: A fitted model with a predict() method, e.g. loaded with load_model().
+        metadata (dict): The features and target the model was trained on, as saved by train_model.py.
+        athlete_ids (list): Optional list of athletes. Defaults to every athlete in the state.
+
+    Returns:
+        pl.DataFrame: One row per athlete with athlete_id, week_no and prediction, in the units of the unscaled target.
+    """
+    features = metadata["features"]
+    df_features = state.features(athlete_ids, columns=features)
+
+    if df_features.is_empty():
+        return pl.DataFrame(
+            {},
+            schema=[
+                ("athlete_id", pl.String),
+                ("week_no", pl.Int64),
+                ("prediction", pl.Float64),
+            ],
+        )
+
+    X = df_features.select(pl.col(features).cast(pl.Float64)).to_numpy()
+    df_predictions = df_features.select("athlete_id", "week_no").with_columns(
+        pl.Series("prediction", model.predict(X), dtype=pl.Float64)
+    )
+
+    # Inverting the min-max scaling of the target
+    target = metadata["target"].removesuffix("_scaled")
+    if metadata["target"].endswith("_scaled") and target in SCALED_COLS:
+        df_predictions = df_predictions.join(
+            state.bounds.select("athlete_id", f"{target}_min", f"{target}_max"),
+            on="athlete_id",
+            how="left",
+        ).select(
+            "athlete_id",
+            "week_no",
+            (
+                pl.col(f"{target}_min")
+                + pl.col("prediction")
+                * (pl.col(f"{target}_max") - pl.col(f"{target}_min"))
+            ).alias("prediction"),
+        )
+
+    return df_predictions
+
+
+def benchmark(
+    state: PredictionState, model, metadata: dict, repeats: int = 100
+) -> dict:
+    """Measures single-athlete latency and full-batch throughput of score().
+    Args:
+        state (PredictionState): The athletes' state.
+        model: A fitted model with a predict() method.
+        metadata (dict): The features and target the model was trained on.
+        repeats (int): The number of timed calls for each measurement.
+
+    Returns:
+        dict: Latency percentiles in milliseconds and throughput in athletes per second.
+    """
+    athlete_ids = state.history["athlete_id"].unique().to_list()
+    rng = np.random.default_rng(0)
+
+    single_ms = []
+    for athlete_id in rng.choice(athlete_ids, size=repeats):
+        start = time.perf_counter()
+        score(state, model, metadata, [athlete_id])
+        single_ms.append((time.perf_counter() - start) * 1000)
+
+    batch_ms = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        score(state, model, metadata)
+        batch_ms.append((time.perf_counter() - start) * 1000)
+
+    results = {
+        "athletes": len(athlete_ids),
+        "single_p50_ms": float(np.percentile(single_ms, 50)),
+        "single_p95_ms": float(np.percentile(single_ms, 95)),
+        "batch_p50_ms": float(np.percentile(batch_ms, 50)),
+        "batch_p95_ms": float(np.percentile(batch_ms, 95)),
+        "batch_athletes_per_second": len(athlete_ids)
+        / (float(np.percentile(batch_ms, 50)) / 1000),
+    }
+
+    for key, value in results.items():
+        print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+    return results
+
+
+def serve(
+    state: PredictionState,
+    model,
+    metadata: dict,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    state_dir=STATE_DIR,
+):
+    """Serves the state and model over HTTP as a local stand-in for a scoring service.
+
+    Endpoints:
+    - GET /health: Returns the number of athletes in the state.
+    - POST /score: Takes {"athlete_ids": [...]} (optional) and returns a list of predictions.
+    - POST /update: Takes a list of weekly rows in the format of final_df.csv, updates and saves the state.
+
+    Requests are handled in threads, so reads and updates of the state are serialised with a lock.
+    """
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body):
+            payload = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/health":
+                with lock:
+                    athletes = state.history["athlete_id"].n_unique()
+                self._send(200, {"athletes": athletes})
+            else:
+                self._send(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            try:
+                body = self._read_json()
+                if self.path == "/score":
+                    start = time.perf_counter()
+                    with lock:
+                        df = score(state, model, metadata, body.get("athlete_ids"))
+                    self._send(
+                        200,
+                        {
+                            "predictions": df.to_dicts(),
+                            "latency_ms": (time.perf_counter() - start) * 1000,
+                        },
+                    )
+                elif self.path == "/update":
+                    with lock:
+                        state.update(pl.DataFrame(body))
+                        state.save(state_dir)
+                        athletes = state.history["athlete_id"].n_unique()
+                    self._send(200, {"athletes": athletes})
+                else:
+                    self._send(404, {"error": f"Unknown path {self.path}"})
+            except (ValueError, KeyError, pl.exceptions.PolarsError) as ex:
+                self._send(400, {"error": str(ex)})
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Serving predictions on http://{host}:{port}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--state-dir", default=STATE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_init = subparsers.add_parser(
+        "init", help="Build the state from the full weekly history."
+    )
+    parser_init.add_argument("--source", default=WEEKLY_CSV)
+
+    parser_update = subparsers.add_parser(
+        "update", help="Add newly processed weeks to the state."
+    )
+    parser_update.add_argument(
+        "weeks", help="CSV of new weekly rows in the format of final_df.csv."
+    )
+
+    for name, help_text in [
+        ("score", "Score the next week for every athlete in the state."),
+        ("benchmark", "Measure scoring latency and throughput."),
+        ("serve", "Serve the state and model over HTTP."),
+    ]:
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument(
+            "--model",
+            required=True,
+            help="Path to a model saved by train_model.py --refit, e.g. models/cache/<run>/final.joblib.",
+        )
+
+    subparsers.choices["score"].add_argument(
+        "--output", help="Optional CSV to write the predictions to."
+    )
+    subparsers.choices["benchmark"].add_argument("--repeats", type=int, default=100)
+    subparsers.choices["serve"].add_argument("--host", default="127.0.0.1")
+    subparsers.choices["serve"].add_argument("--port", type=int, default=8000)
+
+    args = parser.parse_args()
+
+    match args.command:
+        case "init":
+            state = PredictionState.from_weekly(
+                pl.read_csv(args.source, infer_schema_length=None)
+            )
+            state.save(args.state_dir)
+            print(
+                f"Saved state for {state.bounds.height} athletes to {args.state_dir}."
+            )
+        case "update":
+            state = PredictionState.load(args.state_dir)
+            state.update(pl.read_csv(args.weeks, infer_schema_length=None))
+            state.save(args.state_dir)
+            print(f"Updated state saved to {args.state_dir}.")
+        case "score":
+            df_predictions = score(
+                PredictionState.load(args.state_dir), *load_model(args.model)
+            )
+            if args.output:
+                df_predictions.write_csv(args.output)
+            print(df_predictions)
+        case "benchmark":
+            benchmark(
+                PredictionState.load(args.state_dir),
+                *load_model(args.model),
+                repeats=args.repeats,
+            )
+        case "serve":
+            serve(
+                PredictionState.load(args.state_dir),
+                *load_model(args.model),
+                host=args.host,
+                port=args.port,
+                state_dir=args.state_dir,
+            )
@@ -0,0 +1,329 @@
+"""
+This script trains a model on the weekly feature matrix with cross-validation grouped by athlete.
+
+The feature matrix built from data/processed/final_df_scaled.csv is cached as a numpy file and memory-mapped, so it is
+only rebuilt when the CSV changes. Folds are fitted in parallel with joblib. Fold splits and fitted models are cached
+under models/ keyed by the hash of the data and the hash of the training parameters, so rerunning with the same
+settings loads the fitted models instead of refitting them. Split and fit times are reported for every fold.
+
+With --refit, a final model is fitted on every row after cross-validation and saved to final.joblib in the same cache
+directory, together with final.json holding the features and target it was trained on. This is the model that
+predict_model.py loads.
+
+Run from the project root with: python -m src.models.train_model
+"""
+
+# Imports
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+import joblib
+import numpy as np
+import polars as pl
+from joblib import Parallel, delayed
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.model_selection import GroupKFold
+from sklearn.metrics import mean_squared_error, r2_score
+
+from src.features.build_features import file_hash, write_feature_matrix
+
+PROJECT_DIR = Path(__file__).resolve().parents[2]
+
+# Default locations of the input data and cached outputs
+FEATURES_CSV = PROJECT_DIR / "data" / "processed" / "final_df_scaled.csv"
+FEATURE_MATRIX = PROJECT_DIR / "data" / "processed" / "final_df_scaled"
+MODELS_DIR = PROJECT_DIR / "models"
+
+DEFAULT_TARGET = "MMP_max_scaled"
+
+
+def load_feature_matrix(source=FEATURES_CSV, matrix_path=FEATURE_MATRIX):
+    """Memory-maps the feature matrix, rebuilding it only if the source CSV has changed.
+    Args:
+        source: The CSV file the feature matrix is built from.
+        matrix_path: The path of the cached matrix, without a suffix.
+
+    Returns:
+        A tuple (matrix, groups, metadata) where matrix is a read-only memory-mapped float64 array, groups holds an athlete code per row and metadata contains the column names, athlete ids and source hash.
+    """
+    matrix_path = Path(matrix_path)
+    metadata_path = matrix_path.with_suffix(".json")
+    source_hash = file_hash(source)
+
+    metadata = None
+    if metadata_path.exists():
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+
+    if metadata is None or metadata["source_hash"] != source_hash:
+        print(f"Building feature matrix from {source}.")
+        write_feature_matrix(
+            pl.read_csv(source, infer_schema_length=None),
+            matrix_path,
+            source_hash=source_hash,
+        )
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+
+    matrix = np.load(matrix_path.with_suffix(".npy"), mmap_mode="r")
+    groups = np.load(matrix_path.parent / f"{matrix_path.name}_groups.npy")
+
+    return matrix, groups, metadata
+
+
+def default_features(columns: list) -> list:
+    """Returns gender and the scaled lag columns, which only use information available before the target week."""
+    return ["gender"] + [
+        col for col in columns if "_lag_" in col and col.endswith("_scaled")
+    ]
+
+
+def params_hash(params: dict) -> str:
+    """Returns a short hash of a JSON serialisable dictionary of parameters."""
+    return hashlib.sha256(
+        json.dumps(params, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+
+
+def get_fold_splits(groups, rows, n_splits: int, split_hash: str, cache_dir):
+    """Returns the train and test row indices of each fold, loading them from the cache if available.
+    Args:
+        groups: The athlete code of every row in the feature matrix.
+        rows: The indices of the rows used for training, i.e. those with a target value.
+        n_splits (int): The number of folds.
+        split_hash (str): A hash of the source data and the rows used, identifying the splits.
+        cache_dir: The directory the splits are cached in.
+
+    Returns:
+        list: A list of (train_indices, test_indices) tuples.
+    """
+    cache_path = Path(cache_dir) / f"folds_{split_hash}.npz"
+
+    if cache_path.exists():
+        cached = np.load(cache_path)
+        return [(cached[f"train_{i}"], cached[f"test_{i}"]) for i in range(n_splits)]
+
+    splits = [
+        (rows[train], rows[test])
+        for train, test in GroupKFold(n_splits=n_splits).split(
+            rows, groups=groups[rows]
+        )
+    ]
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        cache_path,
+        **{f"train_{i}": train for i, (train, _) in enumerate(splits)},
+        **{f"test_{i}": test for i, (_, test) in enumerate(splits)},
+    )
+
+    return splits
+
+
+def fit_fold(
+    matrix_path,
+    fold: int,
+    train,
+    test,
+    feature_idx,
+    target_idx,
+    model_params,
+    model_path,
+) -> dict:
+    """Fits and scores a model on a single fold. Runs in a joblib worker.
+
+    The feature matrix is memory-mapped inside the worker, so only the row indices are sent to each process.
+
+    Returns:
+        dict: The fold number, number of rows, scores, fit time and whether the model was loaded from the cache.
+    """
+    start = time.perf_counter()
+    matrix = np.load(Path(matrix_path).with_suffix(".npy"), mmap_mode="r")
+    X_train = matrix[train][:, feature_idx]
+    y_train = matrix[train, target_idx]
+    X_test = matrix[test][:, feature_idx]
+    y_test = matrix[test, target_idx]
+    load_seconds = time.perf_counter() - start
+
+    model_path = Path(model_path)
+    cached = model_path.exists()
+    start = time.perf_counter()
+    if cached:
+        model = joblib.load(model_path)
+    else:
+        model = HistGradientBoostingRegressor(**model_params).fit(X_train, y_train)
+        joblib.dump(model, model_path)
+    fit_seconds = time.perf_counter() - start
+
+    y_pred = model.predict(X_test)
+
+    return {
+        "fold": fold,
+        "train_rows": len(train),
+        "test_rows": len(test),
+        "rmse": float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        "r2": float(r2_score(y_test, y_pred)),
+        "load_seconds": load_seconds,
+        "fit_seconds": fit_seconds,
+        "cached": cached,
+    }
+
+
+def refit_model(
+    matrix, rows, features, target, feature_idx, target_idx, model_params, run_dir
+):
+    """Fits a final model on every row and saves it with the features and target it was trained on.
+
+    The model is saved to run_dir/final.joblib and the metadata to run_dir/final.json. A model that is already cached is not
+    refitted.
+
+    Returns:
+        The path of the saved model.
+    """
+    model_path = Path(run_dir) / "final.joblib"
+
+    if model_path.exists():
+        print(f"Final model loaded from the cache in {run_dir}.")
+    else:
+        start = time.perf_counter()
+        model = HistGradientBoostingRegressor(**model_params).fit(
+            matrix[rows][:, feature_idx], matrix[rows, target_idx]
+        )
+        joblib.dump(model, model_path)
+        print(
+            f"Final model fitted on {len(rows)} rows in {time.perf_counter() - start:.2f} s, saved to {model_path}."
+        )
+
+    with open(model_path.with_suffix(".json"), "w") as f:
+        json.dump(
+            {"features": features, "target": target, "model_params": model_params},
+            f,
+            default=str,
+        )
+
+    return model_path
+
+
+def train(
+    target: str = DEFAULT_TARGET,
+    features: list | None = None,
+    model_params: dict | None = None,
+    n_splits: int = 5,
+    n_jobs: int = -1,
+    source=FEATURES_CSV,
+    matrix_path=FEATURE_MATRIX,
+    models_dir=MODELS_DIR,
+    refit: bool = False,
+) -> pl.DataFrame:
+    """Runs grouped-by-athlete cross-validation and returns a dataframe of fold scores and timings.
+    Args:
+        target (str): The column to predict.
+        features (list): The feature columns. Defaults to gender and the scaled lag columns.
+        model_params (dict): Keyword arguments for sklearn's HistGradientBoostingRegressor.
+        n_splits (int): The number of folds.
+        n_jobs (int): The number of folds fitted in parallel. -1 uses every core.
+        source: The CSV file the feature matrix is built from.
+        matrix_path: The path of the cached feature matrix, without a suffix.
+        models_dir: The directory fold splits and fitted models are cached in.
+        refit (bool): Whether to fit a final model on every row after cross-validation, saved as final.joblib with its features and target in final.json.
+
+    Returns:
+        pl.DataFrame: One row per fold with its scores, split, load and fit times, and whether the model was cached.
+    """
+    model_params = model_params or {}
+
+    matrix, groups, metadata = load_feature_matrix(source, matrix_path)
+    columns = metadata["columns"]
+    features = features or default_features(columns)
+    feature_idx = [columns.index(col) for col in features]
+    target_idx = columns.index(target)
+
+    # Only rows with a target value are used for training
+    rows = np.flatnonzero(~np.isnan(matrix[:, target_idx]))
+
+    data_hash = metadata["source_hash"]
+    cache_dir = Path(models_dir) / "cache"
+    start = time.perf_counter()
+    split_hash = params_hash(
+        {"data": data_hash, "target": target, "n_splits": n_splits}
+    )
+    splits = get_fold_splits(groups, rows, n_splits, split_hash, cache_dir)
+    split_seconds = time.perf_counter() - start
+
+    run_hash = params_hash(
+        {
+            "target": target,
+            "features": features,
+            "model_params": model_params,
+            "n_splits": n_splits,
+        }
+    )
+    run_dir = cache_dir / f"{data_hash[:16]}_{run_hash}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(fit_fold)(
+            matrix_path,
+            fold,
+            train_rows,
+            test_rows,
+            feature_idx,
+            target_idx,
+            model_params,
+            run_dir / f"fold_{fold}.joblib",
+        )
+        for fold, (train_rows, test_rows) in enumerate(splits)
+    )
+
+    df_results = pl.DataFrame(results).with_columns(
+        pl.lit(split_seconds).alias("split_seconds")
+    )
+    print(df_results)
+    print(
+        f"Mean RMSE {df_results['rmse'].mean():.4f}, mean R2 {df_results['r2'].mean():.4f}, "
+        f"total fit time {df_results['fit_seconds'].sum():.2f} s. Models cached in {run_dir}."
+    )
+
+    if refit:
+        refit_model(
+            matrix,
+            rows,
+            features,
+            target,
+            feature_idx,
+            target_idx,
+            model_params,
+            run_dir,
+        )
+
+    return df_results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--target", default=DEFAULT_TARGET)
+    parser.add_argument("--n-splits", type=int, default=5)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument(
+        "--model-params",
+        type=json.loads,
+        default={},
+        help="JSON keyword arguments for HistGradientBoostingRegressor, e.g. '{\"max_iter\": 200}'",
+    )
+    parser.add_argument(
+        "--refit",
+        action="store_true",
+        help="Fit a final model on every row after cross-validation, for use with predict_model.py.",
+    )
+    args = parser.parse_args()
+
+    train(
+        target=args.target,
+        model_params=args.model_params,
+        n_splits=args.n_splits,
+        n_jobs=args.n_jobs,
+        refit=args.refit,
+    )
@@ -0,0 +1,342 @@
+"""
+This file contains functions to plot ride data and weekly metrics from the Golden Cheetah dataset.
+
+Second-by-second series are downsampled before plotting so that long rides render in bounded time:
+- minmax_downsample() keeps the minimum and maximum of each bucket, which preserves HR spikes.
+- lttb_downsample() applies Largest-Triangle-Three-Buckets, which preserves the visual shape of the series.
+
+Points that must survive downsampling, such as the boundaries of HRR windows, can be passed through the keep argument.
+save_athlete_reports() writes per-athlete report figures to reports/figures in parallel.
+"""
+
+# Imports
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import matplotlib
+
+from . import plot_settings  # Applies the project's rcParams
+import matplotlib.pyplot as plt
+
+# Maximum number of points drawn per series
+MAX_POINTS = 2000
+
+# Default output directory for report figures
+FIGURES_DIR = Path(__file__).resolve().parents[2] / "reports" / "figures"
+
+# Weekly metrics plotted by default, as named in data/processed/final_df.csv
+WEEKLY_METRICS = ["50_HRR(30)", "75_HRR(30)", "MMP_max", "TRIMP"]
+
+
+# DOWNSAMPLING
+
+
+def _clean(x, y):
+    """Converts x and y to float arrays and drops points where either is missing."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    return x[valid], y[valid]
+
+
+def _merge_keep(x, indices, keep):
+    """Adds the indices of the x values in keep to the selected indices."""
+    if keep is None or len(keep) == 0:
+        return indices
+    keep_indices = np.searchsorted(x, np.asarray(keep, dtype=np.float64))
+    keep_indices = keep_indices[keep_indices < x.size]
+    return np.union1d(indices, keep_indices)
+
+
+def minmax_downsample(x, y, n_out: int = MAX_POINTS, keep=None):
+    """Downsamples a series by keeping the minimum and maximum point of each bucket.
+    Args:
+        x: Sorted x values, e.g. the secs column of an activity.
+        y: The y values, e.g. the hr column of an activity.
+        n_out (int): The approximate number of points to return.
+        keep: Optional x values that must be present in the output.
+
+    Returns:
+        A tuple of numpy arrays (x, y) with at most n_out points plus those in keep.
+    """
+    x, y = _clean(x, y)
+    n = x.size
+    if n <= n_out or n_out < 4:
+        return x, y
+
+    # Two points (min and max) are kept per bucket
+    n_buckets = n_out // 2
+    bucket_size = int(np.ceil(n / n_buckets))
+    n_padded = bucket_size * int(np.ceil(n / bucket_size))
+
+    # Padding the last bucket so that every bucket can be reduced in a single vectorised step
+    y_min = np.pad(y, (0, n_padded - n), constant_values=np.inf).reshape(
+        -1, bucket_size
+    )
+    y_max = np.pad(y, (0, n_padded - n), constant_values=-np.inf).reshape(
+        -1, bucket_size
+    )
+    offsets = np.arange(y_min.shape[0]) * bucket_size
+    indices = np.concatenate(
+        [offsets + y_min.argmin(axis=1), offsets + y_max.argmax(axis=1)]
+    )
+    indices = _merge_keep(x, np.unique(indices), keep)
+
+    return x[indices], y[indices]
+
+
+def lttb_downsample(x, y, n_out: int = MAX_POINTS, keep=None):
+    """Downsamples a series using the Largest-Triangle-Three-Buckets algorithm.
+    Args:
+        x: Sorted x values, e.g. the secs column of an activity.
+        y: The y values, e.g. the power column of an activity.
+        n_out (int): The number of points to return.
+        keep: Optional x values that must be present in the output.
+
+    Returns:
+        A tuple of numpy arrays (x, y) with at most n_out points plus those in keep.
+    """
+    x, y = _clean(x, y)
+    n = x.size
+    if n <= n_out or n_out < 3:
+        return x, y
+
+    # The first and last points are always kept, the rest are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Averaging the next bucket, or using the last point for the final bucket
+        if i < n_out - 3:
+            next_end = edges[i + 2]
+            x_next = x[end:next_end].mean()
+            y_next = y[end:next_end].mean()
+        else:
+            x_next, y_next = x[-1], y[-1]
+
+        # Selecting the point that forms the largest triangle with the previous point and the next bucket
+        areas = np.abs(
+            (x[previous] - x_next) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (y_next - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        indices[i + 1] = previous
+
+    indices = _merge_keep(x, indices, keep)
+
+    return x[indices], y[indices]
+
+
+def downsample(x, y, n_out: int = MAX_POINTS, method: str = "minmax", keep=None):
+    """Downsamples a series using the specified method ("minmax" or "lttb")."""
+    match method:
+        case "minmax":
+            return minmax_downsample(x, y, n_out=n_out, keep=keep)
+        case "lttb":
+            return lttb_downsample(x, y, n_out=n_out, keep=keep)
+        case _:
+            raise ValueError(f"Unknown downsampling method {method!r}.")
+
+
+def _hrr_boundaries(hrr_windows):
+    """Returns the start and end secs of HRR windows as a list, or None if there are no windows."""
+    if hrr_windows is None or len(hrr_windows) == 0:
+        return None
+    hrr_windows = pl.DataFrame(hrr_windows)
+    return (
+        hrr_windows["hrr_window_start_secs"].to_list()
+        + hrr_windows["hrr_window_end_secs"].to_list()
+    )
+
+
+# PLOTTING
+
+
+def plot_ride(
+    activity_data,
+    hrr_windows=None,
+    title: str | None = None,
+    n_out: int = MAX_POINTS,
+):
+    """Plots the heart rate and power series of a ride, downsampled to at most n_out points per series.
+    Args:
+        activity_data: The activity data (pandas or polars) containing the secs, hr and power columns.
+        hrr_windows: Optional output of process_hrr. The windows are shaded and their boundaries are kept during downsampling.
+        title (str): Optional figure title.
+        n_out (int): The maximum number of points drawn per series.
+
+    Returns:
+        The matplotlib figure.
+    """
+    df = pl.DataFrame(activity_data)
+    keep = _hrr_boundaries(hrr_windows)
+
+    fig, ax = plt.subplots(2, 1, sharex=True)
+
+    # Min-max downsampling is used for HR so that spikes remain visible
+    secs, hr = downsample(df["secs"], df["hr"], n_out=n_out, keep=keep)
+    ax[0].plot(secs, hr, linewidth=1)
+    ax[0].set_ylabel("Heart Rate (bpm)")
+
+    secs, power = downsample(df["secs"], df["power"], n_out=n_out, method="lttb")
+    ax[1].plot(secs, power, linewidth=1, color="C1")
+    ax[1].set_ylabel("Power (W)")
+    ax[1].set_xlabel("Time (seconds)")
+
+    # Shading HRR windows on both axes
+    if keep is not None:
+        hrr_windows = pl.DataFrame(hrr_windows)
+        for start, end in hrr_windows.select(
+            "hrr_window_start_secs", "hrr_window_end_secs"
+        ).iter_rows():
+            for axis in ax:
+                axis.axvspan(start, end, color="C2", alpha=0.3)
+
+    if title is not None:
+        fig.suptitle(title)
+    fig.tight_layout()
+
+    return fig
+
+
+def plot_filter_comparison(
+    secs,
+    series: dict,
+    title: str | None = None,
+    n_out: int = MAX_POINTS,
+):
+    """Plots several versions of the same series, e.g. original and Hampel filtered HR, on stacked axes.
+    Args:
+        secs: The time values shared by every series.
+        series (dict): A dictionary mapping a label to each version of the series.
+        title (str): Optional figure title.
+        n_out (int): The maximum number of points drawn per series.
+
+    Returns:
+        The matplotlib figure.
+    """
+    fig, ax = plt.subplots(len(series), 1, sharex=True, sharey=True, squeeze=False)
+
+    for axis, (label, values) in zip(ax[:, 0], series.items()):
+        x, y = downsample(secs, values, n_out=n_out)
+        axis.plot(x, y, linewidth=1)
+        axis.set_title(label)
+        axis.set_ylabel("Heart Rate (bpm)")
+    ax[-1, 0].set_xlabel("Time (seconds)")
+
+    if title is not None:
+        fig.suptitle(title)
+    fig.tight_layout()
+
+    return fig
+
+
+def plot_weekly_metrics(df_weekly, athlete_id: str, metrics: list = WEEKLY_METRICS):
+    """Plots an athlete's weekly metrics against week number, one axis per metric.
+    Args:
+        df_weekly: A dataframe in the format of data/processed/final_df.csv.
+        athlete_id (str): The athlete to plot.
+        metrics (list): The metric columns to plot.
+
+    Returns:
+        The matplotlib figure.
+    """
+    df = (
+        pl.DataFrame(df_weekly)
+        .filter(pl.col("athlete_id") == athlete_id)
+        .sort("week_no")
+    )
+
+    fig, ax = plt.subplots(len(metrics), 1, sharex=True, squeeze=False)
+
+    for i, (axis, metric) in enumerate(zip(ax[:, 0], metrics)):
+        df_metric = df.select("week_no", metric).drop_nulls()
+        axis.plot(
+            df_metric["week_no"],
+            df_metric[metric],
+            marker="o",
+            markersize=3,
+            linewidth=1,
+            color=f"C{i}",
+        )
+        axis.set_ylabel(metric)
+    ax[-1, 0].set_xlabel("Week number")
+    fig.suptitle(f"Weekly metrics for athlete {athlete_id}")
+    fig.tight_layout()
+
+    return fig
+
+
+# BATCH REPORTS
+
+
+def _save_weekly_report(df_athlete: pl.DataFrame, athlete_id: str, output_dir: str):
+    """Renders and saves a single athlete's weekly metric figure. Runs in a worker process."""
+    matplotlib.use("Agg")
+    metrics = [metric for metric in WEEKLY_METRICS if metric in df_athlete.columns]
+    fig = plot_weekly_metrics(df_athlete, athlete_id, metrics=metrics)
+    path = Path(output_dir) / f"{athlete_id}_weekly_metrics.png"
+    fig.savefig(path)
+    plt.close(fig)
+    return str(path)
+
+
+def save_athlete_reports(
+    df_weekly,
+    athlete_ids: list | None = None,
+    output_dir=FIGURES_DIR,
+    max_workers: int | None = None,
+) -> list:
+    """Writes a weekly metric figure for each athlete to output_dir, rendering figures in parallel.
+    Args:
+        df_weekly: A dataframe, or the path to a CSV, in the format of data/processed/final_df.csv.
+        athlete_ids (list): Optional list of athletes to plot. Defaults to every athlete in df_weekly.
+        output_dir: The directory the figures are written to. Defaults to reports/figures.
+        max_workers (int): The number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        list: The paths of the saved figures.
+    """
+    if isinstance(df_weekly, (str, os.PathLike)):
+        df_weekly = pl.read_csv(df_weekly)
+    else:
+        df_weekly = pl.DataFrame(df_weekly)
+
+    if athlete_ids is None:
+        athlete_ids = df_weekly["athlete_id"].unique(maintain_order=True).to_list()
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    # Splitting the dataframe once so that each worker only receives its own athlete's rows
+    df_by_athlete = df_weekly.filter(
+        pl.col("athlete_id").is_in(athlete_ids)
+    ).partition_by("athlete_id", as_dict=True)
+
+    # Worker processes are spawned rather than forked, as forking after polars has started its thread pool can deadlock
+    with ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(
+                _save_weekly_report,
+                df_by_athlete[(athlete_id,)],
+                athlete_id,
+                str(output_dir),
+            )
+            for athlete_id in athlete_ids
+            if (athlete_id,) in df_by_athlete
+        ]
+        paths = [future.result() for future in futures]
+
+    print(f"Saved {len(paths)} figures to {output_dir}.")
+
+    return paths